@@ -13,18 +13,45 @@ TAX_DIR = BASE / "taxonomy"
 def append_unique(src: Path, dest: Path, key_cols):
     import pandas as pd
     if not src.exists(): return
-    s = pd.read_csv(src, dtype=str).fillna("")
-    if dest.exists():
-        d = pd.read_csv(dest, dtype=str).fillna("")
-    else:
-        d = s.iloc[0:0].copy()
-    # align columns
-    for c in set(s.columns) - set(d.columns): d[c]=""
-    for c in set(d.columns) - set(s.columns): s[c]=""
-    both = pd.concat([d, s], ignore_index=True)
-    both = both.drop_duplicates(subset=key_cols, keep="first")
-    both.to_csv(dest, index=False, encoding="utf-8-sig")
-    print(f"Updated {dest.name}: {len(both)} rows")
+    s = pd.read_csv(src, dtype=str, encoding="utf-8-sig").fillna("")
+    # fix packs may lack some key columns (todo_brands has Market, not market): blank, as when aligning
+    s = s.reindex(columns=list(s.columns) + [k for k in key_cols if k not in s.columns], fill_value="")
+    s = s.drop_duplicates(subset=key_cols, keep="first")
+    dest_cols = list(pd.read_csv(dest, dtype=str, nrows=0, encoding="utf-8-sig").columns) if dest.exists() else []
+    d_keys = None
+    if dest_cols and not set(s.columns) - set(dest_cols):
+        d_keys = pd.read_csv(dest, dtype=str, usecols=key_cols, encoding="utf-8-sig").fillna("")
+
+    # new file, src brings columns dest lacks, or dest repeats a key (dropped by the dedupe
+    # over old and new rows together): the whole file has to be rewritten
+    if d_keys is None or d_keys.duplicated().any():
+        if dest_cols:
+            d = pd.read_csv(dest, dtype=str, encoding="utf-8-sig").fillna("")
+        else:
+            d = s.iloc[0:0].copy()
+        # align columns
+        for c in set(s.columns) - set(d.columns): d[c]=""
+        for c in set(d.columns) - set(s.columns): s[c]=""
+        both = pd.concat([d, s], ignore_index=True)
+        both = both.drop_duplicates(subset=key_cols, keep="first")
+        both.to_csv(dest, index=False, encoding="utf-8-sig")
+        print(f"Updated {dest.name}: {len(both)} rows")
+        return
+
+    # otherwise only the key columns of dest are read, and only unseen keys are appended
+    seen = set(d_keys[key_cols].itertuples(index=False, name=None))
+    new = s[[k not in seen for k in s[key_cols].itertuples(index=False, name=None)]]
+    if new.empty:
+        print(f"{dest.name}: no new rows")
+        return
+    new = new.reindex(columns=dest_cols, fill_value="")
+    with open(dest, "rb") as f:
+        f.seek(-1, 2)
+        needs_nl = f.read(1) not in (b"\n", b"\r")
+    with open(dest, "a", encoding="utf-8", newline="") as f:
+        if needs_nl: f.write("\n")
+        new.to_csv(f, header=False, index=False)
+    print(f"Updated {dest.name}: {len(d_keys) + len(new)} rows")
 
 def main():
     append_unique(OUT_DIR/"todo_brands.csv", TAX_DIR/"brands.csv", ["market","raw_brand","raw_variant"])
@@ -3,15 +3,27 @@
 # Two-pass brand resolution:
 #   Pass A: taxonomy alias mapping with market context
 #   Pass B: title match (Plan Name + Campaign Name)
-# Outputs Clean + Issues workbooks in output/
+# Outputs Clean + Issues workbook (and Parquet copies) in output/
+#
+# Optional speed-ups:  pip install python-calamine pyahocorasick pyarrow
 
-import sys, re
+import os, sys, re, functools
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 from datetime import datetime
 import pandas as pd
 import numpy as np
 import unicodedata
 
+try:
+    import ahocorasick  # optional: pip install pyahocorasick (fast title matching)
+except ImportError:
+    ahocorasick = None
+
+from sheet_io import csv_stamp, read_sheet, read_snapshot, write_parquet, write_snapshot
+
 # ----- paths -----
 BASE = Path(__file__).resolve().parents[1]
 IN_DIR  = BASE / "input" / "raw"
@@ -22,28 +34,85 @@ OUT_DIR.mkdir(parents=True, exist_ok=True)
 # ----- text normalisation -----
 _PUNCT = dict.fromkeys(map(ord, '“”‘’′´`"\\\'’–—‑-·•.,;:!/?()[]{}|+&@#%^*~=_'), ' ')
 _SPECIALS = {'™':'', '®':'', '©':'', '℠':'', '\u00A0':' '}
+# built once; specials must go before NFKD (™ -> "TM") and punctuation after it
+_SPECIALS_TABLE = str.maketrans(_SPECIALS)
+_WS_RE = re.compile(r'\s+')
 
 def _strip_accents(s: str) -> str:
-    return "".join(ch for ch in unicodedata.normalize("NFKD", s) if not unicodedata.combining(ch))
+    if s.isascii():
+        return s  # NFKD is a no-op and there are no combining marks
+    # Unicode quick check (TR15): already-decomposed text without marks needs no new string
+    if unicodedata.is_normalized("NFKD", s) and not any(unicodedata.combining(ch) for ch in s):
+        return s
+    n = unicodedata.normalize("NFKD", s)
+    if n.isascii():
+        return n
+    return "".join(ch for ch in n if not unicodedata.combining(ch))
+
+# pure function of the input; Brand/Market/title values repeat heavily across rows
+@functools.lru_cache(maxsize=200_000)
+def _norm_cached(s: str) -> str:
+    # pure-ASCII input (the common case) has no specials and nothing to decompose
+    if not s.isascii():
+        s = s.translate(_SPECIALS_TABLE)
+        s = _strip_accents(s)
+    s = s.translate(_PUNCT)
+    s = s.casefold()
+    s = _WS_RE.sub(' ', s).strip()
+    # keys repeat across idx tuples and rows; one shared object each, pointer-fast ==
+    return sys.intern(s)
 
 def norm(s: str) -> str:
     if s is None:
         return ""
-    s = str(s)
-    s = s.translate(str.maketrans(_SPECIALS))
-    s = _strip_accents(s)
-    s = s.translate(_PUNCT)
-    s = s.casefold()
-    s = re.sub(r'\s+', ' ', s).strip()
-    return s
+    return _norm_cached(str(s))
+
+def norm_col(values) -> np.ndarray:
+    # Column-level norm(): each distinct value is normalised once and broadcast back
+    # through factorize codes, so there is no per-row Python call. Arrow's
+    # utf8_normalize/utf8_lower kernels are not used: lower() is not casefold()
+    # ('ß') and \p{M} is not unicodedata.combining(), so keys would drift from norm().
+    s = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    if pd.api.types.infer_dtype(s, skipna=True) not in ('string', 'empty'):
+        return s.map(norm).to_numpy()  # mixed types: 1, 1.0 and True would share a code
+    codes, uniques = pd.factorize(s)
+    out = np.array([norm(u) for u in uniques] + [''], dtype=object)[codes]
+    na = s.isna().to_numpy()
+    if na.any():
+        out[na] = s[na].map(norm).to_numpy()  # None -> '', NaN -> 'nan', as norm() does
+    return out
 
 # ----- taxonomy load -----
-def load_brands_taxonomy(path: Path) -> pd.DataFrame:
+def _read_csv_str(path: Path, encoding: str) -> pd.DataFrame:
+    # pyarrow engine (pandas >= 2 + pyarrow): multi-threaded parse into Arrow string
+    # columns, i.e. contiguous buffers rather than one Python str object per cell
+    try:
+        return pd.read_csv(path, encoding=encoding, engine='pyarrow',
+                           dtype='string[pyarrow]', keep_default_na=False)
+    except (ImportError, ValueError, TypeError):
+        return pd.read_csv(path, encoding=encoding, dtype=str, keep_default_na=False)
+
+def read_csv_snapshot(path: Path) -> pd.DataFrame:
+    # The CSV stays the curated source of truth (apply_fixes.py appends to it).
+    # A Parquet copy next to it is reused while the CSV is unchanged since it was made,
+    # so repeat runs skip text parsing; the first run writes it (one-shot migration).
+    df = read_snapshot(path, dtype_backend='pyarrow')
+    if df is not None:
+        return df
+    stamp = csv_stamp(path)
     # Tolerant loader: UTF-8 with BOM or plain UTF-8; everything to string
     try:
-        df = pd.read_csv(path, encoding='utf-8-sig', dtype=str, keep_default_na=False)
+        df = _read_csv_str(path, 'utf-8-sig')
     except Exception:
-        df = pd.read_csv(path, encoding='utf-8', dtype=str, keep_default_na=False)
+        df = _read_csv_str(path, 'utf-8')
+    try:
+        write_snapshot(df, path, stamp)
+    except (ImportError, OSError):
+        pass  # no parquet engine installed or read-only dir: keep reading the CSV
+    return df
+
+def load_brands_taxonomy(path: Path) -> pd.DataFrame:
+    df = read_csv_snapshot(path)
     cols = {c:str(c).strip().lower() for c in df.columns}
     df = df.rename(columns=cols)
     # canonical fields
@@ -60,53 +129,101 @@ def load_brands_taxonomy(path: Path) -> pd.DataFrame:
         df['market'] = ''
     df = df[['brand_canonical','market','alias']].copy()
     for c in df.columns:
-        df[c] = df[c].astype(str)
+        if not pd.api.types.is_string_dtype(df[c]):  # leave (Arrow-backed) strings as they are
+            df[c] = df[c].astype(str)
     return df
 
 def build_index(brands: pd.DataFrame):
+    # strip/normalise whole columns, then walk plain arrays;
+    # insertion order matters: it is the tie-break order of title matches
+    canon  = brands['brand_canonical'].str.strip()
+    alias  = brands['alias'].str.strip()
+    alias  = alias.where(alias != '', canon)
+    market = brands['market'].str.strip()
+    n_alias  = norm_col(alias)
+    n_market = norm_col(market)
+    n_canon  = norm_col(canon)
     idx = {}
-    canons = set()
-    for _, r in brands.iterrows():
-        canon = r['brand_canonical'].strip()
-        alias = r['alias'].strip() or canon
-        market = r['market'].strip()
-        if not canon:
+    for c, m, na, nm, nc in zip(canon.to_numpy(), market.to_numpy(), n_alias, n_market, n_canon):
+        if not c:
             continue
-        canons.add(canon)
-        key_g = (None, norm(alias))
-        if key_g not in idx:
-            idx[key_g] = canon
-        if market:
-            key_l = (norm(market), norm(alias))
-            if key_l not in idx:
-                idx[key_l] = canon
+        c = sys.intern(c)  # canonicals repeat across aliases and result rows
+        idx.setdefault((None, na), c)
+        if m:
+            idx.setdefault((nm, na), c)
         # also index the canonical itself as alias
-        key_g2 = (None, norm(canon))
-        idx.setdefault(key_g2, canon)
-        if market:
-            key_l2 = (norm(market), norm(canon))
-            idx.setdefault(key_l2, canon)
-    return idx, sorted(canons)
+        idx.setdefault((None, nc), c)
+        if m:
+            idx.setdefault((nm, nc), c)
+    # title-scan candidates per market key (None = global), in index order; only
+    # aliases long enough to count as a title match (>= 4 chars) are kept
+    aliases_by_market = defaultdict(list)
+    for mk, a in idx:
+        if len(a) >= 4:
+            aliases_by_market[mk].append(a)
+    return idx, sorted({sys.intern(c) for c in canon[canon != '']}), aliases_by_market
 
 # ----- title-based detection -----
-def detect_from_titles(plan_name: str, campaign_name: str, market: str, idx, canon_list):
-    text = f"{plan_name or ''} {campaign_name or ''}"
-    t = norm(text)
-    m = norm(market)
+def build_title_matcher(idx, ncanons):
+    # Aho-Corasick automaton over every normalised canonical/alias (len >= 4), so a
+    # title is scanned once instead of once per alias. None if pyahocorasick is missing.
+    if ahocorasick is None:
+        return None
+    words = {a for (_, a) in idx} | {nc for _, nc in ncanons}
+    A = ahocorasick.Automaton()
+    for w in words:
+        if len(w) >= 4:
+            A.add_word(w, w)
+    if len(A) == 0:
+        return None
+    A.make_automaton()
+    canons_by_norm = {}
+    for j, (canon, ncanon) in enumerate(ncanons):
+        canons_by_norm.setdefault(ncanon, []).append((j, canon))
+    key_pos = {k: i for i, k in enumerate(idx)}
+    return A, canons_by_norm, key_pos
+
+def _title_hits_scan(t: str, m: str, idx, ncanons, aliases_by_market):
     hits = []
     # prefer market-local matches on canonical names
-    for canon in canon_list:
-        ncanon = norm(canon)
+    for canon, ncanon in ncanons:
         if ncanon and ncanon in t and len(ncanon) >= 4:
             hits.append((canon, 'title_contains_canon'))
-    # also allow alias matches
-    # build alias sets
-    local_aliases = [alias for (mk, alias) in idx.keys() if mk == (m or None)]
-    global_aliases = [alias for (mk, alias) in idx.keys() if mk is None]
+    # also allow alias matches (local first, then global)
+    local_aliases = aliases_by_market.get(m or None, [])
+    global_aliases = aliases_by_market.get(None, [])
     for alias in local_aliases + global_aliases:
-        if alias and alias in t and len(alias) >= 4:
+        if alias in t:
             canon = idx[(m if (m, alias) in idx else None, alias)]
             hits.append((canon, 'title_contains_alias'))
+    return hits
+
+def _title_hits_ac(t: str, m: str, idx, matcher):
+    # same hits, in the same order, as _title_hits_scan: canonicals (canon_list order),
+    # then local aliases, then global aliases (both in index order)
+    A, canons_by_norm, key_pos = matcher
+    words = {w for _, w in A.iter(t)} if t else ()
+    ranked = []
+    for w in words:
+        for j, canon in canons_by_norm.get(w, ()):
+            ranked.append(((0, j), canon, 'title_contains_canon'))
+        if (m or None, w) in idx:
+            ranked.append(((1, key_pos[(m or None, w)]), idx[(m or None, w)], 'title_contains_alias'))
+        if (None, w) in idx:
+            canon = idx[(m if (m, w) in idx else None, w)]
+            ranked.append(((2, key_pos[(None, w)]), canon, 'title_contains_alias'))
+    ranked.sort(key=lambda h: h[0])
+    return [(canon, reason) for _, canon, reason in ranked]
+
+def detect_from_titles(t: str, m: str, idx, ncanons, aliases_by_market, matcher=None):
+    # t / m: normalised title ("Plan Name Campaign Name") and market
+    # ncanons: [(canon, norm(canon)), ...] in canon_list order
+    # aliases_by_market: from build_index; matcher: build_title_matcher() result,
+    # or None to scan every alias
+    if matcher is not None:
+        hits = _title_hits_ac(t, m, idx, matcher)
+    else:
+        hits = _title_hits_scan(t, m, idx, ncanons, aliases_by_market)
     if not hits:
         return None, ''
     # de-duplicate preserving order; if multiple distinct canons, ambiguous
@@ -128,50 +245,20 @@ def latest(pattern: str):
     files = [p for p in files if not p.name.startswith('~$')]
     return files[0] if files else None
 
-def read_xlsx_first(path: Path) -> pd.DataFrame:
-    xls = pd.ExcelFile(path, engine='openpyxl')
-    df = xls.parse(xls.sheet_names[0])
-    return df
-
-# ----- main pass -----
-def two_pass_brand(df: pd.DataFrame, brands_df: pd.DataFrame) -> pd.DataFrame:
-    # ensure columns
-    for c in ['Brand','Market','Plan Name','Campaign Name']:
-        if c not in df.columns:
-            # best-effort: case-insensitive rename
-            lc = {str(col).lower(): col for col in df.columns}
-            if c.lower() in lc:
-                df = df.rename(columns={lc[c.lower()]: c})
-            else:
-                df[c] = ''
-    idx, canon_list = build_index(brands_df)
+# ----- per-row decision (Pass B + final/issue) -----
+# Below this many rows per worker the process start-up costs more than it saves
+PARALLEL_MIN_ROWS = 25_000
 
+def _process_chunk(rows, ctx):
+    # rows: (Brand, Market, Plan Name, Campaign Name, tax mapped, tax reason,
+    #        norm title, norm market); ctx: (idx, ncanons, aliases_by_market, matcher)
+    idx, ncanons, aliases_by_market, matcher = ctx
     results = []
-    for i, r in df.iterrows():
-        brand_raw = r.get('Brand','')
-        market = r.get('Market','')
-        plan = r.get('Plan Name','')
-        camp = r.get('Campaign Name','')
-
-        b = norm(brand_raw)
-        m = norm(market)
-
-        # Pass A: taxonomy mapping
-        mapped = None
-        reasonA = ''
-        if (m or None, b) in idx:
-            mapped, reasonA = idx[(m or None, b)], 'tax_exact_local'
-        elif (None, b) in idx:
-            mapped, reasonA = idx[(None, b)], 'tax_exact_global'
-        else:
-            # equality to canonical directly
-            for canon in canon_list:
-                if norm(canon) == b and canon_list:
-                    mapped, reasonA = canon, 'tax_canonical_equal'
-                    break
+    for brand_raw, market, plan, camp, mapped, reasonA, t, m in rows:
+        mapped = mapped or None
 
         # Pass B: title detection
-        title_brand, reasonB = detect_from_titles(plan, camp, market, idx, canon_list)
+        title_brand, reasonB = detect_from_titles(t, m, idx, ncanons, aliases_by_market, matcher)
 
         # Decide final + issue
         final = mapped or title_brand or ''
@@ -204,7 +291,73 @@ def two_pass_brand(df: pd.DataFrame, brands_df: pd.DataFrame) -> pd.DataFrame:
             'Issue': issue,
             'Recommendation': recommend
         })
-    out = pd.DataFrame(results, index=df.index)
+    return results
+
+# ----- main pass -----
+def two_pass_brand(df: pd.DataFrame, brands_df: pd.DataFrame) -> pd.DataFrame:
+    # ensure columns
+    for c in ['Brand','Market','Plan Name','Campaign Name']:
+        if c not in df.columns:
+            # best-effort: case-insensitive rename
+            lc = {str(col).lower(): col for col in df.columns}
+            if c.lower() in lc:
+                df = df.rename(columns={lc[c.lower()]: c})
+            else:
+                df[c] = ''
+    idx, canon_list, aliases_by_market = build_index(brands_df)
+    ncanons = [(c, norm(c)) for c in canon_list]
+    matcher = build_title_matcher(idx, ncanons)
+
+    # normalise once per column instead of per row (and again per title scan)
+    key_cols = ['Brand','Market','Plan Name','Campaign Name']
+    n_brand  = norm_col(df['Brand'])
+    n_market = norm_col(df['Market'])
+    n_title  = norm_col([f"{p or ''} {c or ''}" for p, c in zip(df['Plan Name'], df['Campaign Name'])])
+
+    # line items of one campaign repeat the same inputs: decide each distinct normalised
+    # (brand, market, title) once and broadcast back via codes. Grouping on the norm()
+    # keys rather than the raw cells keeps apart what norm() tells apart (None vs NaN).
+    codes = pd.DataFrame({'b': n_brand, 'm': n_market, 't': n_title}) \
+              .groupby(['b', 'm', 't'], sort=False).ngroup().to_numpy()
+    first = np.unique(codes, return_index=True)[1]
+    uniq = df[key_cols].iloc[first]
+    n_brand, n_market, n_title = n_brand[first], n_market[first], n_title[first]
+
+    # Pass A: taxonomy mapping as two hash joins, local (market, alias) then global (alias).
+    # A blank market looks up the global keys but still reports 'tax_exact_local'.
+    # Canonicals are indexed as global aliases by build_index, so no separate
+    # "equal to canonical" pass is needed.
+    tax_local = pd.DataFrame([(mk or '', a, c) for (mk, a), c in idx.items() if mk != ''],
+                             columns=['_m', '_b', 'Brand_tax_local'])
+    tax_global = tax_local.loc[tax_local['_m'] == '', ['_b', 'Brand_tax_local']] \
+                          .rename(columns={'Brand_tax_local': 'Brand_tax_global'})
+    keys = pd.DataFrame({'_m': n_market, '_b': n_brand})
+    keys = keys.merge(tax_local, on=['_m', '_b'], how='left') \
+               .merge(tax_global, on='_b', how='left')
+    hit_local = keys['Brand_tax_local'].notna()
+    hit_global = keys['Brand_tax_global'].notna()
+    tax_mapped = keys['Brand_tax_local'].combine_first(keys['Brand_tax_global']).fillna('').to_numpy()
+    tax_reason = np.select([hit_local, hit_global], ['tax_exact_local', 'tax_exact_global'], '')
+
+    # plain tuples over just the four columns used, plus the Pass A result and
+    # normalised title/market per row; no Series per row
+    rows = [r + (a, ra, t, m) for r, a, ra, t, m in
+            zip(uniq.itertuples(index=False, name=None), tax_mapped, tax_reason, n_title, n_market)]
+    ctx = (idx, ncanons, aliases_by_market, matcher)
+    workers = min(os.cpu_count() or 1, len(rows) // PARALLEL_MIN_ROWS)
+    if workers > 1:
+        # Pass B is per-row CPU work; fan row chunks out to processes (ctx is read-only)
+        step = -(-len(rows) // workers)
+        chunks = [rows[i:i + step] for i in range(0, len(rows), step)]
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = [r for part in ex.map(_process_chunk, chunks, repeat(ctx)) for r in part]
+    else:
+        results = _process_chunk(rows, ctx)
+    out = pd.DataFrame(results).iloc[codes]
+    out.index = df.index
+    # raw inputs from each row itself, not from its group's first row
+    for c_out, c in zip(['Brand_raw','Market','Plan Name','Campaign Name'], key_cols):
+        out[c_out] = df[c]
     # merge back with original columns for Clean sheet
     clean = df.copy()
     for c in ['Brand_taxonomy','Brand_title','Brand_final','Reason_tax','Reason_title']:
@@ -223,15 +376,26 @@ def main():
         print(f"No plans_*.xlsx in {IN_DIR}")
         sys.exit(0)
     print(f"Loading {plans.name}")
-    df = read_xlsx_first(plans)
+    df = read_sheet(plans)  # all columns: the Clean sheet carries them through
 
     clean, issues = two_pass_brand(df, brands_df)
 
     stamp = datetime.now().strftime("%Y-%m-%d")
+    sheets = {name: frame for name, frame in [('Clean', clean), ('Brand_Issues', issues)] if not frame.empty}
+
+    # Parquet for downstream tooling
+    for name, frame in sheets.items():
+        p_out = OUT_DIR / f"Plans_TwoPass_{name}_{stamp}.parquet"
+        if not write_parquet(frame, p_out):
+            break  # no parquet engine installed: the workbook below is the only output
+        print("Wrote", p_out)
+
+    # workbook for people; xlsxwriter writes several times faster than openpyxl.
+    # Not constant_memory: pandas emits cells column by column and that mode drops them.
     x_out = OUT_DIR / f"Plans_TwoPass_{stamp}.xlsx"
-    with pd.ExcelWriter(x_out, engine='openpyxl') as wb:
-        clean.to_excel(wb, sheet_name='Clean', index=False)
-        issues.to_excel(wb, sheet_name='Brand_Issues', index=False)
+    with pd.ExcelWriter(x_out, engine='xlsxwriter') as wb:
+        for name, frame in sheets.items():
+            frame.to_excel(wb, sheet_name=name, index=False)
     print("Wrote", x_out)
 
 if __name__ == "__main__":
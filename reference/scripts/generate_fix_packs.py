@@ -2,49 +2,61 @@
 from pathlib import Path
 import pandas as pd
 from datetime import datetime
+from sheet_io import read_snapshot
 
 BASE    = Path(__file__).resolve().parents[1]
 OUT_DIR = BASE / "output"
 TAX_DIR = BASE / "taxonomy"
 
+# Columns the fix packs below draw on; anything else in Exceptions.csv is not parsed
+USED_COLS = {"Issue_Type", "Market", "Brand", "Variant", "Current_Value", "FX_Year"}
+
+# Create per-domain fix CSVs listing unique items to classify
+def todo_brands(grp):
+    # Brands needing mapping
+    todo = grp.rename(columns={"Brand":"raw_brand","Variant":"raw_variant"})
+    return todo[["Market","raw_brand","raw_variant"]].drop_duplicates()
+
+def todo_vendors(grp):
+    todo = grp.rename(columns={"Current_Value":"raw_vendor"})
+    return todo[["raw_vendor"]].drop_duplicates()
+
+def todo_channels(grp):
+    todo = grp[["Current_Value"]].drop_duplicates()
+    todo[["Channel","Sub-Channel"]] = todo["Current_Value"].str.split("|", n=1, expand=True)
+    return todo
+
+def todo_cbht(grp):
+    todo = grp.rename(columns={"Current_Value":"brand"})
+    return todo[["brand","Market","FX_Year"]].drop_duplicates()
+
+# Issue_Type -> (fix-pack file, builder)
+FIX_PACKS = {
+    "brand_unmapped":   ("todo_brands.csv",   todo_brands),
+    "vendor_unmapped":  ("todo_vendors.csv",  todo_vendors),
+    "channel_unmapped": ("todo_channels.csv", todo_channels),
+    "cbht_missing":     ("todo_cbht.csv",     todo_cbht),
+}
+
 def main():
     exc = OUT_DIR / "Exceptions.csv"
     if not exc.exists():
         print("No Exceptions.csv found. Run run_cleaning.py first."); return
-    ex = pd.read_csv(exc, dtype=str).fillna("")
-
-    # Create per-domain fix CSVs listing unique items to classify
-    # Brands needing mapping
-    unmapped_brand = ex[ex["Issue_Type"]=="brand_unmapped"]
-    if not unmapped_brand.empty:
-        cols = ["Market","Region","Plan_Name","Brand","Variant"]
-        todo = unmapped_brand.merge(unmapped_brand, how="left")  # just clone to keep columns
-        todo = todo.rename(columns={"Brand":"raw_brand","Variant":"raw_variant"})
-        todo = todo[["Market","raw_brand","raw_variant"]].drop_duplicates()
-        (OUT_DIR/"todo_brands.csv").write_text(todo.to_csv(index=False, encoding="utf-8-sig"))
-
-    # Vendors
-    unmapped_vendor = ex[ex["Issue_Type"]=="vendor_unmapped"]
-    if not unmapped_vendor.empty:
-        todo = unmapped_vendor.rename(columns={"Current_Value":"raw_vendor"})
-        todo = todo[["raw_vendor"]].drop_duplicates()
-        (OUT_DIR/"todo_vendors.csv").write_text(todo.to_csv(index=False, encoding="utf-8-sig"))
-
-    # Channels
-    unmapped_chan = ex[ex["Issue_Type"]=="channel_unmapped"]
-    if not unmapped_chan.empty:
-        todo = unmapped_chan[["Current_Value"]].drop_duplicates()
-        todo[["Channel","Sub-Channel"]] = todo["Current_Value"].str.split("|", n=1, expand=True)
-        (OUT_DIR/"todo_channels.csv").write_text(todo.to_csv(index=False, encoding="utf-8-sig"))
-
-    # CBHT
-    miss_cbht = ex[ex["Issue_Type"]=="cbht_missing"]
-    if not miss_cbht.empty:
-        todo = miss_cbht.rename(columns={"Current_Value":"brand"})
-        todo = todo[["brand","Market","FX_Year"]].drop_duplicates()
-        (OUT_DIR/"todo_cbht.csv").write_text(todo.to_csv(index=False, encoding="utf-8-sig"))
+    # run_cleaning.py also writes a Parquet copy; prefer it unless the CSV was edited since
+    ex = read_snapshot(exc)
+    if ex is not None:
+        ex = ex.fillna("")
+    else:
+        # utf-8-sig: run_cleaning.py writes a BOM, which would otherwise stick to "Market"
+        ex = pd.read_csv(exc, dtype=str, encoding="utf-8-sig", usecols=lambda c: c in USED_COLS).fillna("")
+
+    # one pass over Issue_Type instead of a boolean-mask scan per domain
+    for issue, grp in ex.groupby("Issue_Type", sort=False):
+        if issue in FIX_PACKS:
+            name, build = FIX_PACKS[issue]
+            build(grp).to_csv(OUT_DIR/name, index=False, encoding="utf-8-sig")
 
     print("Fix-pack CSVs created in output/ (todo_*.csv)")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -4,21 +4,31 @@
 # - Applies rules in rules/validation_rules.yaml
 # - Uses taxonomy/*.csv (brands, campaigns, vendors, channels, fx_rates, cbht)
 # - Outputs:
-#     output/Plans_Clean_<YYYY-MM-DD>.xlsx (sheet: fact_media_plan)
+#     output/Plans_Clean_<YYYY-MM-DD>.parquet (or .xlsx, sheet fact_media_plan, without pyarrow)
 #     output/Plans_QA_<YYYY-MM-DD>.xlsx (Exceptions, MappingDiffs)
-#     output/Exceptions.csv
+#     output/Exceptions.csv (+ Exceptions.parquet when pyarrow is installed)
 #     output/Budgets_Clean_<YYYY-MM-DD>.xlsx
 #     output/Budgets_QA_<YYYY-MM-DD>.xlsx
 #
 # Requirements (once):  pip install pandas openpyxl xlsxwriter pyyaml tqdm
+# Optional:             pip install pyarrow   (Parquet Plans_Clean + Exceptions copy)
+#                       pip install python-calamine   (faster Excel reads)
+#                       libyaml (bundled with the pyyaml wheels; faster rules load)
 
-import os, re, io
+import os, re, io, functools
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 from datetime import datetime
 import pandas as pd
 import numpy as np
 import yaml
 from tqdm import tqdm
+try:
+    from yaml import CSafeLoader as _YLoader
+except ImportError:  # pyyaml built without libyaml
+    from yaml import SafeLoader as _YLoader
+from sheet_io import csv_stamp, open_excel, write_parquet, write_snapshot
 
 # ---- Paths ----
 BASE    = Path(__file__).resolve().parents[1]
@@ -28,21 +38,29 @@ TAX_DIR = BASE / "taxonomy"
 RULES_YAML = BASE / "rules" / "validation_rules.yaml"
 TODAY = datetime.now().strftime("%Y-%m-%d")
 
+# ---- Patterns (compiled once) ----
+_WS         = re.compile(r"\s+")
+_NUM_LIKE   = re.compile(r"(cost|spend|views|impressions|fee|percent|rate|eur|dkk|cpm|vcr|reach|frequency|budget)", re.I)
+_METRIC_PAT = re.compile(r"(cost|spend|views|impressions|fee|eur|dkk|cpm|vcr|reach|frequency|budget)", re.I)
+_NON_NUM    = re.compile(r"[^\d\.\-]")  # any non-numeric char, incl. , % € $ £ and spaces
+_YEAR       = re.compile(r"(20\d{2})")
+
 # ---- IO helpers ----
 def read_excel_first(path: Path) -> pd.DataFrame:
-    xls = pd.ExcelFile(path, engine="openpyxl")
-    df0 = xls.parse(xls.sheet_names[0], header=None)
-    header_row = None
-    for i in range(min(30, len(df0))):
-        row = [str(x).strip().lower() for x in df0.iloc[i].tolist() if str(x) != "None"]
-        if any(k in " ".join(row) for k in ["plan", "market", "brand", "start", "end", "currency", "vendor"]):
-            header_row = i; break
-    df = xls.parse(xls.sheet_names[0], header=header_row)
+    with open_excel(path) as xls:
+        # the header is searched for in the first 30 rows only, so parse just those first
+        df0 = xls.parse(xls.sheet_names[0], header=None, nrows=30)
+        header_row = None
+        for i in range(len(df0)):
+            row = [str(x).strip().lower() for x in df0.iloc[i].tolist() if str(x) != "None"]
+            if any(k in " ".join(row) for k in ["plan", "market", "brand", "start", "end", "currency", "vendor"]):
+                header_row = i; break
+        df = xls.parse(xls.sheet_names[0], header=header_row)
 
     # normalise & de-dup column names
     cols, seen = [], {}
     for c in df.columns.astype(str):
-        cc = re.sub(r"\s+", " ", c.strip())
+        cc = _WS.sub(" ", c.strip())
         if cc in seen:
             seen[cc] += 1
             cc = f"{cc}__{seen[cc]}"
@@ -64,7 +82,7 @@ def safe_read_csv(path: Path, usecols=None):
 
 def save_excel(path: Path, sheets: dict[str, pd.DataFrame]):
     path.parent.mkdir(parents=True, exist_ok=True)
-    with pd.ExcelWriter(path, engine="xlsxwriter", options={"strings_to_numbers": False}) as xw:
+    with pd.ExcelWriter(path, engine="xlsxwriter", engine_kwargs={"options": {"strings_to_numbers": False}}) as xw:
         for name, df in sheets.items():
             df.to_excel(xw, sheet_name=name[:31], index=False)
 
@@ -75,47 +93,106 @@ def coerce_dates(df: pd.DataFrame, cols):
             df[c] = pd.to_datetime(df[c], errors="coerce", dayfirst=True)
     return df
 
+def placeholder_dates(fmt: str, years: pd.Series) -> pd.Series:
+    # fmt.format(FX_Year=y) parsed once per distinct year, broadcast to the rows
+    y = years.map(int)
+    return y.map({v: pd.to_datetime(fmt.format(FX_Year=v), dayfirst=True) for v in y.unique()})
+
 def coerce_numeric_cols(df: pd.DataFrame):
     # infer numeric-like by column name
-    pat = r"(cost|spend|views|impressions|fee|percent|rate|eur|dkk|cpm|vcr|reach|frequency|budget)"
-    num_like = [c for c in df.columns if re.search(pat, c, re.I)]
+    num_like = [c for c in df.columns if _NUM_LIKE.search(c)]
     for c in num_like:
-        s = df[c].astype(str)
-        s = s.str.replace(r"[,%€$£ ]", "", regex=True)
-        s = s.str.replace(r"[^\d\.\-]", "", regex=True)
+        s = df[c].astype(str).str.replace(_NON_NUM, "", regex=True)
         df[c] = pd.to_numeric(s, errors="coerce")
     return df
 
 def add_fx_year_from_filename(df: pd.DataFrame, filename: str):
-    m = re.search(r"(20\d{2})", filename)
+    m = _YEAR.search(filename)
     if m and "FX_Year" not in df.columns:
         df["FX_Year"] = int(m.group(1))
     return df
 
+# ---- Taxonomy (read once per process) ----
+# columns each mapper relies on; padded with "" when absent and stripped at load
+TAXONOMY_COLS = {
+    "brands.csv":    ["raw_brand","raw_variant","market","region","brand_clean","brand_type","variant","category","subcategory"],
+    "campaigns.csv": ["raw_campaign","raw_plan_name","market","brand","campaign_clean","campaign_type","campaign_subtype"],
+    "vendors.csv":   ["raw_vendor","vendor_clean","vendor_house","vendor_type"],
+    "channels.csv":  ["Channel Finance Group","Channel","Sub-Channel","ExComChannel"],
+    "fx_rates.csv":  ["market","currency","fx_year","fx_to_eur","fx_to_dkk","region"],
+    "cbht.csv":      ["brand","market","fx_year","brand_league"],
+}
+
+@functools.lru_cache(maxsize=None)
+def load_taxonomy(name: str) -> pd.DataFrame:
+    # shared between calls: mappers must treat the result as read-only
+    df = safe_read_csv(TAX_DIR/name)
+    if name == "channels.csv":
+        df = df.rename(columns={"ChannelFinanceGroup":"Channel Finance Group"})
+    for c in TAXONOMY_COLS.get(name, []):
+        if c not in df.columns: df[c] = ""
+        df[c] = df[c].astype(str).str.strip()
+    if name == "fx_rates.csv":
+        df["currency"] = df["currency"].str.upper()  # plans' Currency is matched upper-cased
+    return df
+
+_TAX_INDEX = {}
+
+def tax_index(tax: pd.DataFrame, tax_keys: list) -> pd.DataFrame:
+    # tax indexed on tax_keys, first row winning on a duplicated key. Taxonomy frames come
+    # from the load_taxonomy cache and live for the whole run, so each index is built once
+    # per process and reused by every file and precedence pass (the entry holds tax, which
+    # keeps its id from being reused).
+    k = (id(tax), tuple(tax_keys))
+    if k not in _TAX_INDEX:
+        _TAX_INDEX[k] = (tax, tax.drop_duplicates(subset=tax_keys).set_index(tax_keys))
+    return _TAX_INDEX[k][1]
+
 # ---- Rules & QA ----
+@functools.lru_cache(maxsize=1)
 def load_rules() -> dict:
     with open(RULES_YAML, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
-
-def qa_event(row, field, issue, current="", suggested="", owner="Analytics", priority="P3", extra=None):
-    d = {
-        "Market": row.get("Market",""),
-        "Region": row.get("Region",""),
-        "FX_Year": row.get("FX_Year",""),
-        "Plan_ID": row.get("Plan ID",""),
-        "Plan_Name": row.get("Plan Name",""),
+        return yaml.load(f, Loader=_YLoader)
+
+QA_ROW_COLS = {"Market":"Market", "Region":"Region", "FX_Year":"FX_Year", "Plan_ID":"Plan ID", "Plan_Name":"Plan Name"}
+
+def qa_events_vec(rows: pd.DataFrame, field, issue, current="", suggested="", owner="Analytics", priority="P3", extra=None):
+    # one QA event per row of `rows`, built column-wise;
+    # current/suggested/extra values are scalars or columns aligned with rows
+    val = lambda v: v.to_numpy() if isinstance(v, pd.Series) else v
+    d = {k: (rows[c].to_numpy() if c in rows.columns else "") for k, c in QA_ROW_COLS.items()}
+    d.update({
         "Field": field,
         "Issue_Type": issue,
-        "Current_Value": current,
-        "Suggested_Value": suggested,
+        "Current_Value": val(current),
+        "Suggested_Value": val(suggested),
         "Priority": priority,
         "Owner": owner,
         "Notes": ""
-    }
-    if extra: d.update(extra)
-    return d
+    })
+    if extra: d.update({k: val(v) for k, v in extra.items()})
+    return pd.DataFrame(d, index=pd.RangeIndex(len(rows)))
+
+def qa_to_frame(qa) -> pd.DataFrame:
+    # qa holds qa_events_vec frames in emission order
+    parts = [e for e in qa if not e.empty]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+def str_col(df: pd.DataFrame, c):
+    # df[c] as str (like f"{v}" per row), or "" when the column is absent (like row.get(c, ""))
+    return df[c].astype(str) if c in df.columns else ""
 
 # ---- Mapping utils ----
+def is_blank(s: pd.Series) -> pd.Series:
+    return s.astype(str).str.strip()==""
+
+def tax_lookup(keys: list, tax: pd.DataFrame, tax_keys: list, cols) -> pd.DataFrame:
+    # Left lookup of tax[cols] by each row's key tuple (keys: one Series per tax_keys
+    # column, aligned with the rows). Unlike a merge this never fans rows out: on a
+    # duplicated taxonomy key the first row wins. Misses (and absent cols) are NaN.
+    at = pd.MultiIndex.from_arrays(keys) if len(keys) > 1 else pd.Index(keys[0])
+    return tax_index(tax, list(tax_keys)).reindex(index=at, columns=list(cols)).set_axis(keys[0].index)
+
 def brands_map(plans: pd.DataFrame, rules: dict, brands_df: pd.DataFrame, qa):
     out = plans.copy()
 
@@ -128,49 +205,44 @@ def brands_map(plans: pd.DataFrame, rules: dict, brands_df: pd.DataFrame, qa):
     out["_raw_variant"] = out.get("Variant","").astype(str).str.strip()
     out["_market"]      = out.get("Market","").astype(str).str.strip()
 
-    # normalise taxonomy
-    b = brands_df.copy()
-    for c in ["raw_brand","raw_variant","market","region","brand_clean","brand_type","variant","category","subcategory"]:
-        if c not in b.columns: b[c] = ""
-        b[c] = b[c].astype(str).str.strip()
+    b = brands_df  # padded/stripped by load_taxonomy
 
     precedence = rules.get("brand_mapping",{}).get("precedence",[])
     outputs    = rules.get("brand_mapping",{}).get("outputs",{})
 
-    # iterative merge by precedence
+    # lookup by precedence; earlier passes win, later ones only fill blanks
+    # blank masks are computed once and narrowed per pass rather than re-derived
+    # from the column text before every fill
+    left_of = {"raw_brand":"_raw_brand", "raw_variant":"_raw_variant", "market":"_market"}
+    blank = {dst: is_blank(out[dst]) for dst in outputs.values()}
     for keys in precedence:
-        left_on, right_on = [], []
-        for k in keys:
-            if   k=="raw_brand":   left_on.append("_raw_brand")
-            elif k=="raw_variant": left_on.append("_raw_variant")
-            elif k=="market":      left_on.append("_market")
-            else:                  left_on.append(k)
-            right_on.append(k)
-
-        m = out.merge(b, how="left", left_on=left_on, right_on=right_on, suffixes=("","_m"))
-
+        hit = tax_lookup([out[left_of.get(k, k)] for k in keys], b, keys, outputs)
         for src, dst in outputs.items():
-            if src not in m.columns: m[src] = ""
-            fill = out[dst].astype(str).str.strip()==""
-            out[dst] = np.where(fill, m[src].reindex(out.index).fillna(""), out[dst])
+            val = hit[src].fillna("")
+            out[dst] = np.where(blank[dst], val, out[dst])
+            blank[dst] &= is_blank(val)
 
     # QA unmapped
-    miss = out["Brand_clean"].astype(str).str.strip()==""
-    for _, r in out.loc[miss].iterrows():
-        qa.append(qa_event(r, "Brand", "brand_unmapped", current=r.get("Brand",""), owner="Analytics", priority="P2"))
+    miss = blank["Brand_clean"] if "Brand_clean" in blank else is_blank(out["Brand_clean"])
+    rows = out.loc[miss]
+    qa.append(qa_events_vec(rows, "Brand", "brand_unmapped", current=rows.get("Brand",""), owner="Analytics", priority="P2"))
 
     # plan-name brand conflict via hints
     hints = rules.get("brand_mapping",{}).get("conflict_hints",{}).get("brand_regex",{})
     out["__hint"] = ""
     if "Plan Name" in out.columns:
+        # first hint (in rules order) wins, so each hint only scans rows no earlier one matched
+        todo = out["Plan Name"].astype(str)
         for k, rgx in hints.items():
-            hit = out["Plan Name"].astype(str).str.contains(rgx, regex=True, na=False)
-            out.loc[hit & (out["__hint"]==""), "__hint"] = k
+            if todo.empty: break
+            hit = todo.str.contains(re.compile(rgx), na=False)
+            out.loc[hit.index[hit], "__hint"] = k
+            todo = todo[~hit]
     conflict = (out["__hint"]!="") & (out["Brand_clean"].astype(str)!=out["__hint"].astype(str))
-    for _, r in out.loc[conflict].iterrows():
-        qa.append(qa_event(r, "Brand", "brand_conflict_with_plan_name",
-                           current=r.get("Brand_clean",""), suggested=r.get("__hint",""),
-                           owner="Analytics", priority="P2"))
+    rows = out.loc[conflict]
+    qa.append(qa_events_vec(rows, "Brand", "brand_conflict_with_plan_name",
+                            current=rows["Brand_clean"], suggested=rows["__hint"],
+                            owner="Analytics", priority="P2"))
     return out.drop(columns=["__hint"], errors="ignore")
 
 def campaigns_map(plans: pd.DataFrame, rules: dict, camp_df: pd.DataFrame, qa):
@@ -182,38 +254,25 @@ def campaigns_map(plans: pd.DataFrame, rules: dict, camp_df: pd.DataFrame, qa):
     out["_market"]       = out.get("Market","").astype(str).str.strip()
     out["_brand"]        = out.get("Brand_clean","").astype(str).str.strip()
 
-    c = camp_df.copy()
-    for col in ["raw_campaign","raw_plan_name","market","brand","campaign_clean","campaign_type","campaign_subtype"]:
-        if col not in c.columns: c[col] = ""
-        c[col] = c[col].astype(str).str.strip()
+    c = camp_df  # padded/stripped by load_taxonomy
 
     precedence = rules.get("campaign_mapping",{}).get("precedence",[])
     outputs    = rules.get("campaign_mapping",{}).get("outputs",{})
 
+    left_of = {"raw_campaign":"_raw_campaign", "market":"_market", "brand":"_brand"}
+    blank = {dst: is_blank(out[dst]) for dst in outputs.values()}
     for keys in precedence:
-        left_on, right_on = [], []
-        for k in keys:
-            if   k=="raw_campaign": left_on.append("_raw_campaign")
-            elif k=="market":       left_on.append("_market")
-            elif k=="brand":        left_on.append("_brand")
-            else:                   left_on.append(k)
-            right_on.append(k)
-
-        m = out.merge(c, how="left", left_on=left_on, right_on=right_on, suffixes=("","_cm"))
+        hit = tax_lookup([out[left_of.get(k, k)] for k in keys], c, keys, outputs)
         for src, dst in outputs.items():
-            if src not in m.columns: m[src] = ""
-            mask = out[dst].astype(str).str.strip()==""
-            # --- patched for index alignment ---
-            if not isinstance(mask, pd.Series):
-                mask = pd.Series(mask, index=out.index, dtype=bool)
-            _aligned_m = m.reindex(out.index)
-            out.loc[mask, dst] = _aligned_m.loc[mask, src].fillna("")
-            # --- end patch ---
+            mask = blank[dst]
+            val = hit.loc[mask, src].fillna("")
+            out.loc[mask, dst] = val
+            blank[dst] = mask & is_blank(val).reindex(out.index, fill_value=False)
     # fallback to raw Campaign Name if still blank
-    miss = out["Campaign_clean"].astype(str).str.strip()==""
+    miss = blank["Campaign_clean"] if "Campaign_clean" in blank else is_blank(out["Campaign_clean"])
     out.loc[miss, "Campaign_clean"] = out.loc[miss, "Campaign Name"].astype(str)
-    for _, r in out.loc[miss].iterrows():
-        qa.append(qa_event(r, "Campaign Name", "campaign_unmapped", current=r.get("Campaign Name",""), owner="Analytics", priority="P3"))
+    rows = out.loc[miss]
+    qa.append(qa_events_vec(rows, "Campaign Name", "campaign_unmapped", current=rows.get("Campaign Name",""), owner="Analytics", priority="P3"))
     return out
 
 def vendors_map(plans: pd.DataFrame, rules: dict, vend_df: pd.DataFrame, qa):
@@ -222,27 +281,29 @@ def vendors_map(plans: pd.DataFrame, rules: dict, vend_df: pd.DataFrame, qa):
         if c not in out.columns: out[c] = ""
 
     out["_raw_vendor"] = out.get("Vendor","").astype(str).str.strip()
-    v = vend_df.copy()
-    for col in ["raw_vendor","vendor_clean","vendor_house","vendor_type"]:
-        if col not in v.columns: v[col] = ""
-        v[col] = v[col].astype(str).str.strip()
-
-    m = out.merge(v, how="left", left_on="_raw_vendor", right_on="raw_vendor", suffixes=("","_v"))
-    for src, dst in [("vendor_clean","Vendor_clean"), ("vendor_house","Vendor_House"), ("vendor_type","Vendor_Type")]:
-        fill = out[dst].astype(str).str.strip()==""
-        # --- patched for index alignment ---
-        if not isinstance(fill, pd.Series):
-            fill = pd.Series(fill, index=out.index, dtype=bool)
-        _aligned_m = m.reindex(out.index)
-        out.loc[fill, dst] = _aligned_m.loc[fill, src].fillna("")
-        # --- end patch ---
+    v = vend_df  # padded/stripped by load_taxonomy
+
+    outputs = {"vendor_clean":"Vendor_clean", "vendor_house":"Vendor_House", "vendor_type":"Vendor_Type"}
+    hit = tax_lookup([out["_raw_vendor"]], v, ["raw_vendor"], outputs)
+    for src, dst in outputs.items():
+        fill = is_blank(out[dst])
+        out.loc[fill, dst] = hit.loc[fill, src].fillna("")
     # QA for unmapped vendors → _Placeholder
-    miss = out["Vendor_clean"].astype(str).str.strip()==""
+    miss = is_blank(out["Vendor_clean"])
     out.loc[miss, "Vendor_clean"] = "_Placeholder"
-    for _, r in out.loc[miss].iterrows():
-        qa.append(qa_event(r, "Vendor", "vendor_unmapped", current=r.get("Vendor",""), suggested="_Placeholder", owner="Partnerships", priority="P2"))
+    rows = out.loc[miss]
+    qa.append(qa_events_vec(rows, "Vendor", "vendor_unmapped", current=rows.get("Vendor",""), suggested="_Placeholder", owner="Partnerships", priority="P2"))
     return out
 
+def channel_lookup(out: pd.DataFrame, ch: pd.DataFrame, key: str, cols: dict) -> pd.DataFrame:
+    # channels.csv values by `key`, renamed to the output columns. As with the left
+    # merge this replaces, a taxonomy column the plan itself carries (the key, and
+    # e.g. Channel / Channel Finance Group in plans) keeps the row's own value.
+    hit = tax_lookup([out[key]], ch, [key], cols)
+    own = [col for col in cols if col in out.columns]
+    hit[own] = out[own]
+    return hit.rename(columns=cols).fillna("")
+
 def channels_map(plans: pd.DataFrame, rules: dict, ch_df: pd.DataFrame, qa):
     out = plans.copy()
     for c in ["Channel_clean","SubChannel_clean","ChannelFinanceGroup_clean","ExComChannel"]:
@@ -251,57 +312,52 @@ def channels_map(plans: pd.DataFrame, rules: dict, ch_df: pd.DataFrame, qa):
     cfg = rules.get("channel_rules",{})
     prefer = cfg.get("prefer_key","Sub-Channel")
 
-    c = ch_df.copy()
-    c = c.rename(columns={"ChannelFinanceGroup":"Channel Finance Group"})
-    for col in ["Channel Finance Group","Channel","Sub-Channel","ExComChannel"]:
-        if col not in c.columns: c[col] = ""
-        c[col] = c[col].astype(str).str.strip()
+    c = ch_df  # renamed/padded/stripped by load_taxonomy
+
+    # taxonomy column -> output column
+    cols = {"Channel":"Channel_clean", "Sub-Channel":"SubChannel_clean",
+            "Channel Finance Group":"ChannelFinanceGroup_clean", "ExComChannel":"ExComChannel"}
+    dst = list(cols.values())
 
     # 1st pass by preferred key
     if prefer in ["Sub-Channel","Channel"]:
         key = prefer
-        m = out.merge(c, how="left", left_on=key, right_on=key, suffixes=("","_c"))
-        out["Channel_clean"]             = np.where(out["Channel_clean"].eq(""), m["Channel"].fillna(""), out["Channel_clean"])
-        out["SubChannel_clean"]          = np.where(out["SubChannel_clean"].eq(""), m["Sub-Channel"].fillna(""), out["SubChannel_clean"])
-        out["ChannelFinanceGroup_clean"] = np.where(out["ChannelFinanceGroup_clean"].eq(""), m["Channel Finance Group"].fillna(""), out["ChannelFinanceGroup_clean"])
-        out["ExComChannel"]              = np.where(out["ExComChannel"].eq(""), m["ExComChannel"].fillna(""), out["ExComChannel"])
+        hit = channel_lookup(out, c, key, cols)
+        out[dst] = out[dst].mask(out[dst].eq(""), hit)
 
-        # fallback by the other key
+        # fallback by the other key, for rows still without a finance group
         other = "Channel" if key=="Sub-Channel" else "Sub-Channel"
-        miss = out["ChannelFinanceGroup_clean"].astype(str).str.strip()==""
+        miss = is_blank(out["ChannelFinanceGroup_clean"])
         if miss.any():
-            m2 = out.merge(c, how="left", left_on=other, right_on=other, suffixes=("","_c2"))
-            out.loc[miss, "Channel_clean"]             = np.where(out.loc[miss, "Channel_clean"].eq(""),             m2.loc[miss, "Channel"].fillna(""), out.loc[miss, "Channel_clean"])
-            out.loc[miss, "SubChannel_clean"]          = np.where(out.loc[miss, "SubChannel_clean"].eq(""),          m2.loc[miss, "Sub-Channel"].fillna(""), out.loc[miss, "SubChannel_clean"])
-            out.loc[miss, "ChannelFinanceGroup_clean"] = np.where(out.loc[miss, "ChannelFinanceGroup_clean"].eq(""), m2.loc[miss, "Channel Finance Group"].fillna(""), out.loc[miss, "ChannelFinanceGroup_clean"])
-            out.loc[miss, "ExComChannel"]              = np.where(out.loc[miss, "ExComChannel"].eq(""),              m2.loc[miss, "ExComChannel"].fillna(""), out.loc[miss, "ExComChannel"])
+            hit = channel_lookup(out, c, other, cols)
+            out[dst] = out[dst].mask(out[dst].eq("") & miss.to_numpy()[:, None], hit)
 
     # QA any unresolved channel parts
-    miss_any = (out["ChannelFinanceGroup_clean"].astype(str).str.strip()=="") | \
-               (out["Channel_clean"].astype(str).str.strip()=="") | \
-               (out["SubChannel_clean"].astype(str).str.strip()=="")
-    for _, r in out.loc[miss_any].iterrows():
-        qa.append(qa_event(r, "Channel", "channel_unmapped",
-                           current=f"{r.get('Channel','')}|{r.get('Sub-Channel','')}", owner="Analytics", priority="P3"))
+    miss_any = is_blank(out["ChannelFinanceGroup_clean"]) | is_blank(out["Channel_clean"]) | is_blank(out["SubChannel_clean"])
+    rows = out.loc[miss_any]
+    qa.append(qa_events_vec(rows, "Channel", "channel_unmapped",
+                            current=str_col(rows, "Channel") + "|" + str_col(rows, "Sub-Channel"), owner="Analytics", priority="P3"))
     return out
 
 def region_check(plans: pd.DataFrame, rules: dict, fx_df: pd.DataFrame, qa):
     if not rules.get("region_check",{}).get("enabled", False):
         return plans
     out = plans.copy()
-    fx = fx_df.copy()
-    for c in ["market","region"]:
-        if c not in fx.columns: fx[c]=""
-        fx[c]=fx[c].astype(str).str.strip()
-    map_reg = fx.drop_duplicates(subset=["market"]).set_index("market")["region"].to_dict()
-    for _, r in out.iterrows():
-        mkt = str(r.get("Market","")).strip()
-        reg = str(r.get("Region","")).strip()
-        exp = map_reg.get(mkt, "")
-        if exp and reg and exp!=reg:
-            qa.append(qa_event(r, "Region", "region_mismatch", current=reg, suggested=exp, owner="Analytics", priority="P3"))
-        if mkt and (mkt not in map_reg):
-            qa.append(qa_event(r, "Market", "market_unknown", current=mkt, owner="Analytics", priority="P3"))
+    fx = fx_df  # padded/stripped by load_taxonomy
+    map_reg = tax_index(fx, ["market"])["region"].to_dict()
+    mkt = pd.Series(str_col(out, "Market"), index=out.index, dtype=object).str.strip()
+    reg = pd.Series(str_col(out, "Region"), index=out.index, dtype=object).str.strip()
+    exp = mkt.map(map_reg).fillna("")
+    mismatch = (exp!="") & (reg!="") & (exp!=reg)
+    unknown  = (mkt!="") & ~mkt.isin(map_reg.keys())
+    ev = [
+        qa_events_vec(out.loc[mismatch], "Region", "region_mismatch", current=reg[mismatch], suggested=exp[mismatch], owner="Analytics", priority="P3")
+          .set_axis(np.flatnonzero(mismatch)),
+        qa_events_vec(out.loc[unknown], "Market", "market_unknown", current=mkt[unknown], owner="Analytics", priority="P3")
+          .set_axis(np.flatnonzero(unknown)),
+    ]
+    # keep row order, mismatch before unknown within a row (stable sort on row position)
+    qa.append(pd.concat(ev).sort_index(kind="stable").reset_index(drop=True))
     return out
 
 def actualisation_backfill(plans: pd.DataFrame, rules: dict, qa):
@@ -322,36 +378,31 @@ def actualisation_backfill(plans: pd.DataFrame, rules: dict, qa):
         sc = cfg.get(scope,{})
         a = sc.get("actual_col"); p = sc.get("planned_col"); flag=sc.get("qa_flag","missing_actualisation")
         if a in out.columns and p in out.columns:
-            miss = old_mask & ((out[a].isna()) | (pd.to_numeric(out[a], errors="coerce").fillna(0)==0))
+            # blank/unparseable actuals coerce to NaN, so one conversion covers both tests
+            miss = old_mask & pd.to_numeric(out[a], errors="coerce").fillna(0).eq(0)
             out.loc[miss, a] = pd.to_numeric(out.loc[miss, p], errors="coerce").fillna(0)
-            for _, r in out.loc[miss].iterrows():
-                qa.append(qa_event(r, a, flag, current="0/blank", suggested=str(r.get(p,0)), owner="Analytics", priority="P2",
-                                   extra={"Days_Since_End": int(days_old.get(r.name, np.nan))}))
+            rows = out.loc[miss]
+            qa.append(qa_events_vec(rows, a, flag, current="0/blank", suggested=rows[p].astype(str), owner="Analytics", priority="P2",
+                                    extra={"Days_Since_End": days_old[miss].astype(int)}))
     return out
 
 def fx_merge_and_derive(plans: pd.DataFrame, rules: dict, fx_df: pd.DataFrame, qa):
     out = plans.copy()
-    fx = fx_df.copy()
+    fx = fx_df  # padded/stripped/upper-cased by load_taxonomy
 
     out["_Market"]   = out.get("Market","").astype(str).str.strip()
     out["_Currency"] = out.get("Currency","").astype(str).str.strip().str.upper()
     out["_Year"]     = out.get("FX_Year","").astype(str).str.strip()
 
-    for c in ["market","currency","fx_year","fx_to_eur","fx_to_dkk","region"]:
-        if c not in fx.columns: fx[c]=""
-        fx[c] = fx[c].astype(str).str.strip()
-    fx["_Market"]   = fx["market"]
-    fx["_Currency"] = fx["currency"].str.upper()
-    fx["_Year"]     = fx["fx_year"]
-
-    m = out.merge(fx[["_Market","_Currency","_Year","fx_to_eur","fx_to_dkk","region"]],
-                  how="left", on=["_Market","_Currency","_Year"], suffixes=("","_fx"))
-    out["fx_to_eur"] = pd.to_numeric(m["fx_to_eur"], errors="coerce")
-    out["fx_to_dkk"] = pd.to_numeric(m["fx_to_dkk"], errors="coerce")
+    hit = tax_lookup([out["_Market"], out["_Currency"], out["_Year"]], fx, ["market","currency","fx_year"], ["fx_to_eur","fx_to_dkk"])
+    out["fx_to_eur"] = pd.to_numeric(hit["fx_to_eur"], errors="coerce")
+    out["fx_to_dkk"] = pd.to_numeric(hit["fx_to_dkk"], errors="coerce")
 
     miss = out["fx_to_eur"].isna() | out["fx_to_dkk"].isna()
-    for _, r in out.loc[miss].iterrows():
-        qa.append(qa_event(r, "FX", "fx_missing", current=f"{r.get('Market','')}/{r.get('Currency','')}/{r.get('FX_Year','')}", owner="Analytics", priority="P1"))
+    rows = out.loc[miss]
+    qa.append(qa_events_vec(rows, "FX", "fx_missing",
+                            current=str_col(rows, "Market") + "/" + str_col(rows, "Currency") + "/" + str_col(rows, "FX_Year"),
+                            owner="Analytics", priority="P1"))
 
     # derive DKK/EUR columns
     pairs = rules.get("fx_rules",{}).get("compute_pairs",{})
@@ -371,15 +422,16 @@ def fx_merge_and_derive(plans: pd.DataFrame, rules: dict, fx_df: pd.DataFrame, q
             ("Total Cost to Client Actual (Global)","Actualised_Spend_EUR"),
             ("Net Media Cost (Global)","Net_Media_EUR"),
         ]
+        checks = [(g, c) for g, c in checks if g in out.columns and c in out.columns]
+        # all present pairs in one frame op, keyed by the calculated column
+        num = lambda cols: out[cols].apply(pd.to_numeric, errors="coerce").fillna(0).set_axis([c for _, c in checks], axis=1)
+        given, calc = num([g for g, _ in checks]), num([c for _, c in checks])
+        bad = given.gt(0) & ((given - calc).abs() / given.mask(given.eq(0), 1)).gt(tol)
         for given_col, calc_col in checks:
-            if given_col in out.columns and calc_col in out.columns:
-                given = pd.to_numeric(out[given_col], errors="coerce").fillna(0)
-                calc  = pd.to_numeric(out[calc_col], errors="coerce").fillna(0)
-                bad = (given>0) & ((np.abs(given-calc) / np.where(given!=0, given, 1)) > tol)
-                for _, r in out.loc[bad].iterrows():
-                    qa.append(qa_event(r, calc_col, "eur_mismatch",
-                                       current=str(r.get(given_col,0)), suggested=str(r.get(calc_col,0)),
-                                       owner="Analytics", priority="P3"))
+            rows = out.loc[bad[calc_col]]
+            qa.append(qa_events_vec(rows, calc_col, "eur_mismatch",
+                                    current=rows[given_col].astype(str), suggested=rows[calc_col].astype(str),
+                                    owner="Analytics", priority="P3"))
     return out
 
 # ---- CBHT ----
@@ -387,10 +439,7 @@ def cbht_join(plans: pd.DataFrame, rules: dict, cb_df: pd.DataFrame, qa):
     out = plans.copy()
     if "CBHT_Brand_League" not in out.columns: out["CBHT_Brand_League"] = ""
 
-    cb = cb_df.copy()
-    for c in ["brand","market","fx_year","brand_league"]:
-        if c not in cb.columns: cb[c]=""
-        cb[c]=cb[c].astype(str).str.strip()
+    cb = cb_df  # padded/stripped by load_taxonomy
 
     order = rules.get("cbht_rules",{}).get("join_keys_order",[
         ["Brand_clean","Market","FX_Year"],
@@ -398,129 +447,140 @@ def cbht_join(plans: pd.DataFrame, rules: dict, cb_df: pd.DataFrame, qa):
         ["Brand_clean"],
     ])
 
+    # map left keys to cbht cols
+    lkmap = {"Brand_clean":"brand","Market":"market","FX_Year":"fx_year"}
+    # compare as stripped text: cbht.csv is all strings, FX_Year in plans is an int;
+    # each key column is stringified once for all passes
+    left_of = {k: out[k].astype(str).str.strip() for k in dict.fromkeys(k for keys in order for k in keys)}
+    fill = is_blank(out["CBHT_Brand_League"])
     for keys in order:
-        # map left keys to cbht cols
-        lkmap = {"Brand_clean":"brand","Market":"market","FX_Year":"fx_year"}
-        right_on = [lkmap.get(k,k) for k in keys]
-        m = out.merge(cb[["brand","market","fx_year","brand_league"]],
-                      how="left", left_on=keys, right_on=right_on, suffixes=("","_cb"))
-        fill = out["CBHT_Brand_League"].astype(str).str.strip()==""
-        out.loc[fill, "CBHT_Brand_League"] = m.loc[fill, "brand_league"].fillna("")
-
-    miss_cb = out["CBHT_Brand_League"].astype(str).str.strip()==""
-    for _, r in out.loc[miss_cb].iterrows():
-        qa.append(qa_event(r, "CBHT_Brand_League","cbht_missing", current=r.get("Brand_clean",""), owner="Insights", priority="P2"))
+        hit = tax_lookup([left_of[k] for k in keys], cb, [lkmap.get(k,k) for k in keys], ["brand_league"])
+        val = hit.loc[fill, "brand_league"].fillna("")
+        out.loc[fill, "CBHT_Brand_League"] = val
+        fill = fill & is_blank(val).reindex(out.index, fill_value=False)
+
+    miss_cb = fill
+    rows = out.loc[miss_cb]
+    qa.append(qa_events_vec(rows, "CBHT_Brand_League","cbht_missing", current=rows["Brand_clean"], owner="Insights", priority="P2"))
     return out
 
+# ---- Per-file fan-out ----
+def map_files(fn, paths, rules: dict, desc: str):
+    # fn(path, rules) for every workbook, in path order. Files are independent and
+    # parsing is CPU-bound, so with several files and cores each gets a worker process.
+    workers = min(len(paths), os.cpu_count() or 1)
+    if workers < 2:
+        return [fn(p, rules) for p in tqdm(paths, desc=desc)]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        return list(tqdm(ex.map(fn, paths, repeat(rules)), total=len(paths), desc=desc))
+
 # ---- Plans pipeline ----
+def process_plan_file(p: Path, rules: dict):
+    # one plans workbook -> (cleaned frame, its QA events); top-level so it can run in a worker
+    qa = []
+    fx_df   = load_taxonomy("fx_rates.csv")
+    brands  = load_taxonomy("brands.csv")
+    vendors = load_taxonomy("vendors.csv")
+    camps   = load_taxonomy("campaigns.csv")
+    chans   = load_taxonomy("channels.csv")
+    cbht    = load_taxonomy("cbht.csv")
+
+    df = read_excel_first(p)
+    df = add_fx_year_from_filename(df, p.name)
+
+    # normalise expected columns
+    needed = ["FX_Year","Currency","Region","Market","Brand","Variant","Channel","Sub-Channel","Channel Finance Group",
+              "Vendor","Campaign Name","Objective","Buying Model","Innovation","Inventory Buy","Creative Source",
+              "Start Date","End Date","Plan ID","Plan Name","Plan Status"]
+    for c in needed:
+        if c not in df.columns: df[c] = ""
+
+    # coerce types
+    df = coerce_dates(df, ["Start Date","End Date"])
+    df = coerce_numeric_cols(df)
+
+    # Plan Status defaults & drop cancelled
+    if "Plan Status" in df.columns:
+        blank = is_blank(df["Plan Status"])
+        if blank.any():
+            df.loc[blank, "Plan Status"] = rules.get("defaults",{}).get("Plan Status","Planned")
+            qa.append(qa_events_vec(df.loc[blank], "Plan Status","status_defaulted", suggested="Planned", owner="Offshore Ops", priority="P3"))
+        cancelled = df["Plan Status"].astype(str).str.lower().isin(["cancelled","canceled"])
+        qa.append(qa_events_vec(df.loc[cancelled], "Plan Status","row_dropped_cancelled"))
+        df = df.loc[~cancelled].copy()
+
+    # Date placeholders & drop truly empty metric rows
+    ph = rules.get("date_placeholders",{})
+    metric_cols = [c for c in df.columns if _METRIC_PAT.search(c)]
+    nums = df[metric_cols].apply(pd.to_numeric, errors="coerce").fillna(0).abs().sum(axis=1)
+    s_missing = df["Start Date"].isna()
+    e_missing = df["End Date"].isna()
+    drop = s_missing & e_missing & nums.eq(0)
+    ev = [qa_events_vec(df.loc[drop], "Row","row_dropped_empty").set_axis(np.flatnonzero(drop))]
+    for field, key, missing in [("Start Date","start_if_missing",s_missing), ("End Date","end_if_missing",e_missing)]:
+        fill = missing & ~drop
+        if ph.get(key) and fill.any():
+            df.loc[fill, field] = placeholder_dates(ph[key], df.loc[fill, "FX_Year"])
+            ev.append(qa_events_vec(df.loc[fill], field,"date_placeholder_applied",
+                                    suggested=df.loc[fill, field].dt.date.astype(str)).set_axis(np.flatnonzero(fill)))
+    # per-row order as before: dropped, else start then end placeholder
+    qa.append(pd.concat(ev).sort_index(kind="stable").reset_index(drop=True))
+    df = df.loc[~drop]
+
+    # Defaults / temporary fills
+    for field, default_val in [
+        ("Objective", rules.get("temporary_fills",{}).get("Objective","Awareness")),
+        ("Buying Model", rules.get("defaults",{}).get("Buying Model","Fixed Cost")),
+        ("Innovation", rules.get("defaults",{}).get("Innovation","No")),
+        ("Inventory Buy", rules.get("defaults",{}).get("Inventory Buy","No")),
+        ("Creative Source", rules.get("defaults",{}).get("Creative Source","Locally Produced Asset")),
+    ]:
+        miss = is_blank(df[field])
+        if miss.any():
+            df.loc[miss, field] = default_val
+            qa.append(qa_events_vec(df.loc[miss], field, f"{field.replace(' ','_').lower()}_defaulted", suggested=default_val))
+
+    # Objective whitelist
+    allowed = set(rules.get("allowed_objectives",[]))
+    if allowed:
+        bad = ~df["Objective"].astype(str).isin(allowed)
+        if bad.any():
+            qa.append(qa_events_vec(df.loc[bad], "Objective","objective_normalised", current=df.loc[bad, "Objective"], suggested="Awareness"))
+            df.loc[bad, "Objective"] = "Awareness"
+
+    # Region QA vs fx_rates
+    df = region_check(df, rules, fx_df, qa)
+
+    # Deterministic enrichment
+    df = brands_map(df, rules, brands, qa)
+    df = vendors_map(df, rules, vendors, qa)
+    df = channels_map(df, rules, chans, qa)
+    df = campaigns_map(df, rules, camps, qa)
+
+    # Backfill actualisation (older than N days)
+    df = actualisation_backfill(df, rules, qa)
+
+    # FX merge & compute derived EUR/DKK columns
+    df = fx_merge_and_derive(df, rules, fx_df, qa)
+
+    # CBHT
+    df = cbht_join(df, rules, cbht, qa)
+
+    return df, qa
+
 def process_plans(rules: dict):
     paths = sorted(list(IN_DIR.glob("plans_*.xlsx")) + list(IN_DIR.glob("Plans_*.xlsx")))
     if not paths: return pd.DataFrame(), {}, pd.DataFrame(), pd.DataFrame()
 
     frames, qa = [], []
-    fx_df   = safe_read_csv(TAX_DIR/"fx_rates.csv")
-    brands  = safe_read_csv(TAX_DIR/"brands.csv")
-    vendors = safe_read_csv(TAX_DIR/"vendors.csv")
-    camps   = safe_read_csv(TAX_DIR/"campaigns.csv")
-    chans   = safe_read_csv(TAX_DIR/"channels.csv")
-    cbht    = safe_read_csv(TAX_DIR/"cbht.csv")
-
-    for p in tqdm(paths, desc="Reading plans"):
-        df = read_excel_first(p)
-        df = add_fx_year_from_filename(df, p.name)
-
-        # normalise expected columns
-        needed = ["FX_Year","Currency","Region","Market","Brand","Variant","Channel","Sub-Channel","Channel Finance Group",
-                  "Vendor","Campaign Name","Objective","Buying Model","Innovation","Inventory Buy","Creative Source",
-                  "Start Date","End Date","Plan ID","Plan Name","Plan Status"]
-        for c in needed:
-            if c not in df.columns: df[c] = ""
-
-        # coerce types
-        df = coerce_dates(df, ["Start Date","End Date"])
-        df = coerce_numeric_cols(df)
-
-        # Plan Status defaults & drop cancelled
-        if "Plan Status" in df.columns:
-            blank = df["Plan Status"].astype(str).str.strip()==""
-            if blank.any():
-                df.loc[blank, "Plan Status"] = rules.get("defaults",{}).get("Plan Status","Planned")
-                for _, r in df.loc[blank].iterrows():
-                    qa.append(qa_event(r, "Plan Status","status_defaulted", suggested="Planned", owner="Offshore Ops", priority="P3"))
-            cancelled = df["Plan Status"].astype(str).str.lower().isin(["cancelled","canceled"])
-            for _, r in df.loc[cancelled].iterrows():
-                qa.append(qa_event(r, "Plan Status","row_dropped_cancelled"))
-            df = df.loc[~cancelled].copy()
-
-        # Date placeholders & drop truly empty metric rows
-        ph = rules.get("date_placeholders",{})
-        metric_pat = r"(cost|spend|views|impressions|fee|eur|dkk|cpm|vcr|reach|frequency|budget)"
-        metric_cols = [c for c in df.columns if re.search(metric_pat, c, re.I)]
-        for idx, r in df.iterrows():
-            s = r.get("Start Date"); e = r.get("End Date")
-            nums = pd.to_numeric(pd.Series({c:r.get(c) for c in metric_cols}), errors="coerce").fillna(0)
-            all_zero = float(nums.abs().sum()) == 0.0
-            if pd.isna(s) and pd.isna(e) and all_zero:
-                df.loc[idx,"__drop"] = True
-                qa.append(qa_event(r, "Row","row_dropped_empty"))
-            else:
-                fx_year = r.get("FX_Year", datetime.now().year)
-                if pd.isna(s) and ph.get("start_if_missing"):
-                    df.loc[idx,"Start Date"] = pd.to_datetime(ph["start_if_missing"].format(FX_Year=int(fx_year)), dayfirst=True)
-                    qa.append(qa_event(r, "Start Date","date_placeholder_applied", suggested=str(df.loc[idx,"Start Date"].date())))
-                if pd.isna(e) and ph.get("end_if_missing"):
-                    df.loc[idx,"End Date"] = pd.to_datetime(ph["end_if_missing"].format(FX_Year=int(fx_year)), dayfirst=True)
-                    qa.append(qa_event(r, "End Date","date_placeholder_applied", suggested=str(df.loc[idx,"End Date"].date())))
-        if "__drop" in df.columns:
-            df = df.loc[df["__drop"]!=True].drop(columns="__drop")
-
-        # Defaults / temporary fills
-        for field, default_val in [
-            ("Objective", rules.get("temporary_fills",{}).get("Objective","Awareness")),
-            ("Buying Model", rules.get("defaults",{}).get("Buying Model","Fixed Cost")),
-            ("Innovation", rules.get("defaults",{}).get("Innovation","No")),
-            ("Inventory Buy", rules.get("defaults",{}).get("Inventory Buy","No")),
-            ("Creative Source", rules.get("defaults",{}).get("Creative Source","Locally Produced Asset")),
-        ]:
-            miss = df[field].astype(str).str.strip()==""
-            if miss.any():
-                df.loc[miss, field] = default_val
-                for _, r in df.loc[miss].iterrows():
-                    qa.append(qa_event(r, field, f"{field.replace(' ','_').lower()}_defaulted", suggested=default_val))
-
-        # Objective whitelist
-        allowed = set(rules.get("allowed_objectives",[]))
-        if allowed:
-            bad = ~df["Objective"].astype(str).isin(allowed)
-            if bad.any():
-                for _, r in df.loc[bad].iterrows():
-                    qa.append(qa_event(r, "Objective","objective_normalised", current=r.get("Objective",""), suggested="Awareness"))
-                df.loc[bad, "Objective"] = "Awareness"
-
-        # Region QA vs fx_rates
-        df = region_check(df, rules, fx_df, qa)
-
-        # Deterministic enrichment
-        df = brands_map(df, rules, brands, qa)
-        df = vendors_map(df, rules, vendors, qa)
-        df = channels_map(df, rules, chans, qa)
-        df = campaigns_map(df, rules, camps, qa)
-
-        # Backfill actualisation (older than N days)
-        df = actualisation_backfill(df, rules, qa)
-
-        # FX merge & compute derived EUR/DKK columns
-        df = fx_merge_and_derive(df, rules, fx_df, qa)
-
-        # CBHT
-        df = cbht_join(df, rules, cbht, qa)
-
+    for df, file_qa in map_files(process_plan_file, paths, rules, "Reading plans"):
         frames.append(df)
+        qa.extend(file_qa)
 
     plans = pd.concat(frames, ignore_index=True).drop_duplicates()
 
     # QA outputs
-    qa_df = pd.DataFrame(qa)
+    qa_df = qa_to_frame(qa)
     map_cols = ["Plan ID","Market","Plan Name","Brand","Brand_clean","Variant","Variant_clean","Vendor","Vendor_clean","Campaign Name","Campaign_clean"]
     mapping_diffs = plans[[c for c in map_cols if c in plans.columns]].drop_duplicates()
 
@@ -530,32 +590,38 @@ def process_plans(rules: dict):
     return fact, {"Exceptions": qa_df, "MappingDiffs": mapping_diffs}, plans, qa_df
 
 # ---- Budgets pipeline ----
-def process_budgets(rules: dict):
-    paths = sorted(list(IN_DIR.glob("budgets_*.xlsx")) + list(IN_DIR.glob("Budgets_*.xlsx")))
-    if not paths: return pd.DataFrame(), {}
+def process_budget_file(p: Path, rules: dict):
+    # one budgets workbook -> (cleaned frame, its QA events)
+    qa = []
+    fx_df = load_taxonomy("fx_rates.csv")
+    chans = load_taxonomy("channels.csv")
 
-    frames, qa = [], []
-    fx_df = safe_read_csv(TAX_DIR/"fx_rates.csv")
-    chans = safe_read_csv(TAX_DIR/"channels.csv")
+    df = read_excel_first(p)
+    df = add_fx_year_from_filename(df, p.name)
+
+    for c in ["Market","Region","Brand","ChannelFinanceGroup","Sub-Channel","Channel"]:
+        if c not in df.columns: df[c]=""
 
-    for p in tqdm(paths, desc="Reading budgets"):
-        df = read_excel_first(p)
-        df = add_fx_year_from_filename(df, p.name)
+    df = channels_map(df, rules, chans, qa)  # fills Channel*_clean where possible
+    df = coerce_numeric_cols(df)
 
-        for c in ["Market","Region","Brand","ChannelFinanceGroup","Sub-Channel","Channel"]:
-            if c not in df.columns: df[c]=""
+    # FX conversion if currency present (some budget extracts may lack it)
+    if "Currency" in df.columns:
+        df = fx_merge_and_derive(df, rules, fx_df, qa)
 
-        df = channels_map(df, rules, chans, qa)  # fills Channel*_clean where possible
-        df = coerce_numeric_cols(df)
+    return df, qa
 
-        # FX conversion if currency present (some budget extracts may lack it)
-        if "Currency" in df.columns:
-            df = fx_merge_and_derive(df, rules, fx_df, qa)
+def process_budgets(rules: dict):
+    paths = sorted(list(IN_DIR.glob("budgets_*.xlsx")) + list(IN_DIR.glob("Budgets_*.xlsx")))
+    if not paths: return pd.DataFrame(), {}
 
+    frames, qa = [], []
+    for df, file_qa in map_files(process_budget_file, paths, rules, "Reading budgets"):
         frames.append(df)
+        qa.extend(file_qa)
 
     bud = pd.concat(frames, ignore_index=True).drop_duplicates()
-    qa_df = pd.DataFrame(qa)
+    qa_df = qa_to_frame(qa)
     return bud, ({"Exceptions": qa_df} if not qa_df.empty else {})
 
 # ---- Entrypoint ----
@@ -572,11 +638,19 @@ def main():
     bc_path = OUT_DIR / f"Budgets_Clean_{TODAY}.xlsx"
     bq_path = OUT_DIR / f"Budgets_QA_{TODAY}.xlsx"
 
-    if not plans_clean.empty:
+    # the fact table is for tooling, so Parquet; the workbook only when that is not possible
+    if not plans_clean.empty and not write_parquet(plans_clean, pc_path.with_suffix(".parquet")):
         save_excel(pc_path, {"fact_media_plan": plans_clean})
     if plans_qa_tabs:
         if "Exceptions" in plans_qa_tabs and isinstance(plans_qa_tabs["Exceptions"], pd.DataFrame) and not plans_qa_tabs["Exceptions"].empty:
-            plans_qa_tabs["Exceptions"].to_csv(OUT_DIR / "Exceptions.csv", index=False, encoding="utf-8-sig")
+            exc_df = plans_qa_tabs["Exceptions"]
+            exc_csv = OUT_DIR / "Exceptions.csv"
+            exc_df.to_csv(exc_csv, index=False, encoding="utf-8-sig")
+            # Parquet copy for generate_fix_packs.py, stringified like the CSV (mixed-type cols cannot go to Arrow)
+            try:
+                write_snapshot(exc_df.fillna("").astype(str), exc_csv, csv_stamp(exc_csv))
+            except ImportError:
+                pass
         sheets = {k:v for k,v in plans_qa_tabs.items() if isinstance(v, pd.DataFrame) and not v.empty}
         if sheets: save_excel(pq_path, sheets)
 
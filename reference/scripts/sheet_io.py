@@ -0,0 +1,167 @@
+# sheet_io.py
+# Excel/Parquet helpers shared by the scripts in this folder; each script imports
+# them from here (the script's own folder is on sys.path when it is run).
+import datetime
+import re
+import zipfile
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+# string dtype for the vectorised text cleaning: Arrow string kernels when pyarrow
+# is installed (several times faster for the regex/strip chains), Python otherwise
+try:
+    import pyarrow  # noqa: F401
+    ARROW_STR = "string[pyarrow]"
+except ImportError:
+    ARROW_STR = "string"
+
+def open_excel(path):
+    # calamine (Rust reader; pandas >= 2.2 + python-calamine) parses several times faster
+    # than openpyxl and also reads .xls; openpyxl (read-only, cached values instead of
+    # formulas) stays as the fallback. Both give the same cells.
+    try:
+        return pd.ExcelFile(path, engine="calamine")
+    except (ImportError, ValueError):  # python-calamine missing / pandas too old for the engine
+        return pd.ExcelFile(path, engine="openpyxl")
+
+def read_sheet(path, **kw):
+    # first sheet of a workbook via open_excel; kw as for pd.read_excel
+    with open_excel(path) as xls:
+        return xls.parse(xls.sheet_names[0], **kw)
+
+# Parquet snapshots of CSVs (the CSV stays the source of truth). A snapshot carries the
+# stamp of the CSV version it was made from and is only used while the CSV still has that
+# exact size and mtime_ns, so an edit within the filesystem's mtime granularity still counts.
+def csv_stamp(csv):
+    st = csv.stat()
+    return f"{st.st_size}:{st.st_mtime_ns}".encode()
+
+def read_snapshot(csv, **kw):
+    # the Parquet copy next to csv, or None when it is missing, unreadable or stale; kw as for pd.read_parquet
+    try:
+        import pyarrow.parquet as pq
+        if (pq.read_schema(csv.with_suffix(".parquet")).metadata or {}).get(b"source_csv") != csv_stamp(csv):
+            return None
+        return pd.read_parquet(csv.with_suffix(".parquet"), **kw)
+    except Exception:
+        return None
+
+def write_snapshot(df, csv, stamp):
+    # stamp: csv_stamp(csv) taken before reading the CSV (or after writing it), so a change
+    # in between leaves a snapshot that no longer matches. Raises ImportError without pyarrow.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    t = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(t.replace_schema_metadata({**(t.schema.metadata or {}), b"source_csv": stamp}),
+                   csv.with_suffix(".parquet"))
+
+def write_xlsx(df, path, sheet_name):
+    # stream rows straight into a constant-memory xlsxwriter sheet rather than through
+    # pandas' per-cell formatter; same cells, header style and yyyy-mm-dd dates
+    wb = xlsxwriter.Workbook(path, {"constant_memory": True, "default_date_format": "yyyy-mm-dd"})
+    ws = wb.add_worksheet(sheet_name)
+    ws.write_row(0, 0, list(df.columns), wb.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"}))
+    cells = df.astype(object).where(df.notna(), None)  # NaN/NaT -> blank cell
+    for i, row in enumerate(cells.itertuples(index=False, name=None), 1):
+        ws.write_row(i, 0, row)
+    wb.close()
+
+# write_xlsx_fast (--fast-xlsx in the split scripts): the worksheet XML is generated
+# column-wise and zipped directly, skipping xlsxwriter's per-cell calls. Plain cells:
+# bold header, yyyy-mm-dd dates, no other styling. Numbers go out as %.16g and control
+# characters as _xHHHH_, as xlsxwriter writes them. Unlike xlsxwriter's write(), text
+# is always an inline string: "=..." is not turned into a formula, nor URLs into links.
+_XLSX_NS = "http://schemas.openxmlformats.org/"
+_XLSX_PARTS = {
+    "[Content_Types].xml":
+        f'<Types xmlns="{_XLSX_NS}package/2006/content-types">'
+        f'<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        f'<Default Extension="xml" ContentType="application/xml"/>'
+        f'<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        f'<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        f'<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/></Types>',
+    "_rels/.rels":
+        f'<Relationships xmlns="{_XLSX_NS}package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{_XLSX_NS}officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/></Relationships>',
+    "xl/_rels/workbook.xml.rels":
+        f'<Relationships xmlns="{_XLSX_NS}package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{_XLSX_NS}officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        f'<Relationship Id="rId2" Type="{_XLSX_NS}officeDocument/2006/relationships/styles" Target="styles.xml"/></Relationships>',
+    # cellXfs: 0 default, 1 date, 2 bold header
+    "xl/styles.xml":
+        f'<styleSheet xmlns="{_XLSX_NS}spreadsheetml/2006/main">'
+        f'<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy\\-mm\\-dd"/></numFmts>'
+        f'<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        f'<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+        f'<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        f'<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        f'<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        f'<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        f'<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+        f'<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles></styleSheet>',
+}
+_XML_CTRL = re.compile(r"_x[0-9a-fA-F]{4}_|[\x00-\x08\x0b-\x1f]")
+_EXCEL_EPOCH = np.datetime64("1899-12-30")
+
+def _xml_str(s):
+    s = s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    # control characters (and literal _xHHHH_) escaped the way Excel reads them back
+    return _XML_CTRL.sub(lambda m: "_x005F" + m[0] if len(m[0]) > 1 else f"_x{ord(m[0]):04X}_", s)
+
+def _xml_cell(v):
+    # one <c> for a Python value: bool, number, date/datetime as a date serial,
+    # anything else as inline text via str()
+    if v is None or v is pd.NA or v is pd.NaT or (isinstance(v, str) and not v):
+        return "<c/>"
+    if isinstance(v, (bool, np.bool_)):
+        return f'<c t="b"><v>{int(v)}</v></c>'
+    if isinstance(v, (int, float, np.number)):
+        return f"<c><v>{float(v):.16g}</v></c>" if np.isfinite(float(v)) else "<c/>"
+    if isinstance(v, (datetime.datetime, datetime.date)):
+        return f'<c s="1"><v>{(pd.Timestamp(v) - pd.Timestamp(_EXCEL_EPOCH)) / pd.Timedelta(days=1):.16g}</v></c>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{_xml_str(str(v))}</t></is></c>'
+
+def _xml_col(col):
+    # <c> strings for a column: numbers and dates formatted in bulk, anything else cell by cell
+    v = col.to_numpy()
+    if col.dtype.kind == "M":
+        num, style = (v - _EXCEL_EPOCH) / np.timedelta64(1, "D"), ' s="1"'
+    elif col.dtype.kind in "iuf":
+        num, style = v.astype("float64"), ""
+    else:
+        return np.array([_xml_cell(x) for x in v], dtype=object)
+    ok = np.isfinite(num)
+    cells = np.full(len(v), "<c/>", dtype=object)
+    cells[ok] = np.char.add(np.char.add(f"<c{style}><v>", np.char.mod("%.16g", num[ok])), "</v></c>")
+    return cells
+
+def write_xlsx_fast(df, path, sheet_name, chunk=50_000):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, xml in _XLSX_PARTS.items():
+            zf.writestr(name, xml)
+        zf.writestr("xl/workbook.xml",
+                    f'<workbook xmlns="{_XLSX_NS}spreadsheetml/2006/main" xmlns:r="{_XLSX_NS}officeDocument/2006/relationships">'
+                    f'<sheets><sheet name="{_xml_str(sheet_name)}" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as f:
+            f.write(f'<worksheet xmlns="{_XLSX_NS}spreadsheetml/2006/main"><sheetData><row>'.encode())
+            f.write("".join(f'<c t="inlineStr" s="2"><is><t xml:space="preserve">{_xml_str(str(c))}</t></is></c>'
+                            for c in df.columns).encode() + b"</row>")
+            for i in range(0, len(df), chunk):
+                part = df.iloc[i:i + chunk]
+                rows = np.full(len(part), "<row>", dtype=object)
+                for j in range(part.shape[1]):
+                    rows += _xml_col(part.iloc[:, j])
+                f.write(("</row>".join(rows) + "</row>").encode())
+            f.write(b"</sheetData></worksheet>")
+
+def write_parquet(df, path):
+    # Arrow wants one type per column: object columns mixing text and numbers (as typed
+    # in the sheet) are stored as text. False when no parquet engine is installed.
+    mixed = [c for c in df.columns if df[c].dtype == object
+             and pd.api.types.infer_dtype(df[c], skipna=True) in ("mixed", "mixed-integer")]
+    try:
+        df.astype({c: "string" for c in mixed}).to_parquet(path, index=False, compression="zstd")
+        return True
+    except ImportError:
+        return False
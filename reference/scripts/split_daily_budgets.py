@@ -1,12 +1,16 @@
 #!/usr/bin/env python3
+import argparse
 from pathlib import Path
 import pandas as pd
+import numpy as np
 import re
+import functools
 import unicodedata
+from sheet_io import ARROW_STR, read_sheet, write_xlsx, write_xlsx_fast, write_parquet
 
 IN_FILE  = Path("budgets_cleaned.xlsx")
-OUT_FILE = Path("budgets_daily.xlsx")
-DEBUG_FILE = Path("planned_debug.csv")
+OUT_FILE = Path("budgets_daily.xlsx")  # only with --xlsx/--fast-xlsx; the default output is the .parquet next to it
+DEBUG_FILE = Path("planned_debug.csv.gz")
 
 START_COL = "Min Start Date"
 END_COL   = "Max End Date"
@@ -26,123 +30,99 @@ PRORATE_COLS = [
     "Actualised (DKK)",
 ]
 
-# remove control/unicode whitespace, normalize
+_ws_re = re.compile(r"\s+")
+
+# remove control/unicode whitespace, normalize (memoised: the same names are
+# looked up for every constant and PRORATE_COLS entry)
+@functools.lru_cache(maxsize=1024)
 def clean_header(s):
     if pd.isna(s):
         return s
     s = str(s)
     s = unicodedata.normalize("NFKC", s)
     # replace non-breaking spaces and other unicode spaces with normal spaces
-    s = re.sub(r"\s+", " ", s)
+    s = _ws_re.sub(" ", s)
     return s.strip()
 
-# tolerant numeric parser with many edge cases
-_num_re = re.compile(r"[^\d\-\.\(\)]+")
-
-def parse_number(x):
-    if pd.isna(x):
-        return None
-    s = str(x).strip()
-    if s == "":
-        return None
-    s = unicodedata.normalize("NFKC", s)
-    s = s.replace("\xa0", "")  # NBSP
+# tolerant numeric parser with many edge cases, applied to a whole column.
+# Patterns stay plain strings (Arrow's regex engine takes no compiled re) and ASCII-only
+# so both string backends agree.
+_num_re = r"[^0-9\-\.\(\)]+"
+_paren_re = r"^\(.*\)$"
+_float_re = r"-?(?:[0-9]+\.?[0-9]*|\.[0-9]+)"   # what float() accepts from the cleaned text
+_PLACEHOLDERS = frozenset({"-", "—", "–", "NA", "N/A", "n/a", "na", "--"})
+
+def clean_numeric_series(col):
+    # float per cell, NaN for blanks, placeholders and anything that does not parse
+    # str() per cell first: numeric cells keep their full repr, as in float(str(x))
+    s = col.astype(str).astype(ARROW_STR).mask(col.isna()).str.strip()
+    s = s.str.normalize("NFKC").str.replace("\xa0", "", regex=False)  # NBSP
     # common placeholders -> treat as missing
-    if s in ("-", "—", "–", "NA", "N/A", "n/a", "na", "--"):
-        return None
+    s = s.mask(s.isin(_PLACEHOLDERS))
     # remove currency symbols and commas but keep parentheses/minus/dot
-    s = _num_re.sub("", s)
-    if s == "":
-        return None
-    if s.startswith("(") and s.endswith(")"):
-        s = "-" + s[1:-1]
-    try:
-        return float(s)
-    except Exception:
-        return None
+    s = s.str.replace(_num_re, "", regex=True)
+    s = s.mask(s.str.match(_paren_re), "-" + s.str[1:-1])
+    # astype rather than pd.to_numeric: same correctly rounded parse as float()
+    return s.where(s.str.fullmatch(_float_re)).astype("float64")
 
 def main():
-    df_raw = pd.read_excel(IN_FILE, sheet_name=0, dtype="object")
-
-    # normalize headers
-    df_raw.columns = [clean_header(c) for c in df_raw.columns]
-    df = df_raw.copy()
-
-    # ensure PRORATE_COLS use normalized names if variants exist
-    mapped_prorate = []
-    for col in PRORATE_COLS:
-        col_n = clean_header(col)
-        if col_n in df.columns:
-            mapped_prorate.append(col_n)
-    # ensure planned col normalized
-    planned_col = clean_header(PLANNED_COL)
+    ap = argparse.ArgumentParser(description="Split budgets_cleaned.xlsx into one row per day.")
+    ap.add_argument("--xlsx", action="store_true", help=f"also write {OUT_FILE}")
+    ap.add_argument("--fast-xlsx", action="store_true",
+                    help=f"also write {OUT_FILE}, generating the sheet XML directly (faster, plain styling)")
+    ap.add_argument("--fp32", action="store_true",
+                    help="store the prorated columns as float32 (half the size, ~7 significant digits)")
+    args = ap.parse_args()
+
+    df_raw = read_sheet(IN_FILE, dtype="object")
+
+    # normalize headers once (raw -> clean) and resolve every known column against them
+    header_map = {c: clean_header(c) for c in df_raw.columns}
+    df = df_raw.rename(columns=header_map)
+    START, END, FX_YEAR, planned_col = map(clean_header, (START_COL, END_COL, FX_YEAR_COL, PLANNED_COL))
+    mapped_prorate = [c for c in map(clean_header, PRORATE_COLS) if c in df.columns]
 
     # validate date cols
-    if clean_header(START_COL) not in df.columns or clean_header(END_COL) not in df.columns:
+    if START not in df.columns or END not in df.columns:
         raise SystemExit(f"Missing required date columns after header normalisation. Found: {list(df.columns)}")
-    START = clean_header(START_COL)
-    END = clean_header(END_COL)
 
     df[START] = pd.to_datetime(df[START], errors="coerce")
     df[END]   = pd.to_datetime(df[END], errors="coerce")
 
-    out_rows = []
-    debug_rows = []
-
-    total_input_planned_count = 0
-    total_emitted_planned_positive = 0
-
-    for ix, row in df.iterrows():
-        s = row[START]
-        e = row[END]
-
-        if pd.isna(s) or pd.isna(e):
-            fy = row.get(clean_header(FX_YEAR_COL))
-            try:
-                y = int(float(str(fy)))
-                s = pd.Timestamp(y, 1, 1)
-                e = pd.Timestamp(y, 12, 31)
-            except Exception:
-                base = row.copy()
-                for col in mapped_prorate:
-                    base[col] = 0.0
-                base["Date"] = pd.NaT
-                out_rows.append(base)
-                # collect debug if original had planned-like content
-                orig_planned = row.get(planned_col) if planned_col in row.index else None
-                if orig_planned not in (None, "", pd.NA) and str(orig_planned).strip() != "":
-                    debug_rows.append(dict(row))
-                continue
-
-        days = pd.date_range(s.normalize(), e.normalize(), freq="D")
-        n = max(1, len(days))
-        base = row.copy()
-
-        # before prorating, record if original planned had content
-        orig_planned_val = row.get(planned_col) if planned_col in row.index else None
-        orig_parsed = parse_number(orig_planned_val) if orig_planned_val is not None else None
-        if orig_parsed is not None:
-            total_input_planned_count += 1
-
-        for col in mapped_prorate:
-            val = parse_number(base[col]) if col in base.index else None
-            if val is None:
-                base[col] = 0.0
-            else:
-                base[col] = val / n
-
-        # after prorating, check emitted planned positive (sum across days will equal original)
-        if planned_col in base.index:
-            # if original had value, count emitted positive (non-zero)
-            if orig_parsed is not None and orig_parsed != 0:
-                total_emitted_planned_positive += 1
-
-        for d in days:
-            rr = base.copy()
-            rr["Date"] = d
-            out_rows.append(rr)
-
-    out = pd.DataFrame(out_rows)
+    # FX-Year fallback for rows without both dates: the whole year, or a single
+    # zeroed row with no Date when the year does not parse either
+    nat = df[START].isna() | df[END].isna()
+    fy = df[FX_YEAR] if FX_YEAR in df.columns else pd.Series(None, index=df.index, dtype=object)
+    y = pd.to_numeric(fy.astype(str).str.strip(), errors="coerce")
+    y = np.trunc(y).where(nat)
+    y = y.where(y.between(1678, 2261))   # Timestamp(y,1,1)..(y,12,31) must be in range
+    by_year = y.notna()
+    failed = nat & ~by_year
+    yr = pd.to_datetime(y[by_year].astype(int).astype(str), format="%Y")
+    s = df[START].dt.normalize().mask(by_year, yr).mask(failed)
+    e = df[END].dt.normalize().mask(by_year, yr + pd.offsets.YearEnd(0))
+
+    # inclusive day count per row; end before start emits nothing, failed rows emit one
+    span = ((e - s).dt.days + 1).fillna(0).astype(int).clip(lower=0)
+    reps = span.mask(failed, 1).to_numpy()
+    n = span.clip(lower=1)
+
+    # rows with original planned content that still ended up on the fallback path
+    planned = df[planned_col] if planned_col in df.columns else pd.Series(None, index=df.index, dtype=object)
+    debug_rows = df.loc[failed & planned.notna() & planned.astype(str).str.strip().ne("")]
+
+    # counters over the rows that were split (not the failed ones)
+    planned_num = clean_numeric_series(planned)
+    total_input_planned_count = int((~failed & planned_num.notna()).sum())
+    total_emitted_planned_positive = int((~failed & planned_num.notna() & planned_num.ne(0)).sum()) if planned_col in df.columns else 0
+
+    # parse, then divide every prorate column by the day count in one 2-D op; failed rows carry zeros
+    num = pd.DataFrame({c: clean_numeric_series(df[c]) for c in mapped_prorate}, index=df.index)
+    num = num.div(n, axis=0).fillna(0.0)
+    num.loc[failed] = 0.0
+    df[mapped_prorate] = num
+    if args.fp32:
+        df[mapped_prorate] = df[mapped_prorate].astype("float32")
 
     # Insert Date after Max End Date
     orig_cols = list(df.columns)
@@ -152,17 +132,25 @@ def main():
     else:
         cols = ["Date"] + orig_cols
 
-    final_cols = [c for c in cols if c in out.columns] + [c for c in out.columns if c not in cols]
-    out = out.reindex(columns=final_cols)
-
-    # write outputs
-    with pd.ExcelWriter(OUT_FILE, engine="xlsxwriter", datetime_format="yyyy-mm-dd") as xw:
-        out.to_excel(xw, index=False, sheet_name="fact_budget_daily")
-
-    if debug_rows:
-        pd.DataFrame(debug_rows).to_csv(DEBUG_FILE, index=False)
+    # one output row per day, built column by column in output order: each row's values repeated
+    # reps times, Date its start offset by 0..reps-1 days
+    pos = np.repeat(np.arange(len(df)), reps)
+    day = np.arange(len(pos)) - np.repeat(np.cumsum(reps) - reps, reps)
+    dates = s.to_numpy()[pos] + day.astype("timedelta64[D]")
+    out = pd.DataFrame({c: dates if c == "Date" else df[c].to_numpy()[pos] for c in cols}, copy=False)
+
+    # write outputs: Parquet for downstream ETL; the xlsx copy on request, or when pyarrow is missing
+    out_pq = OUT_FILE.with_suffix(".parquet")
+    wrote_pq = write_parquet(out, out_pq)
+    if wrote_pq:
+        print(f"Wrote {out_pq.resolve()} with {len(out):,} rows.")
+    if args.xlsx or args.fast_xlsx or not wrote_pq:
+        (write_xlsx_fast if args.fast_xlsx else write_xlsx)(out, OUT_FILE, "fact_budget_daily")
+        print(f"Wrote {OUT_FILE.resolve()} with {len(out):,} rows.")
+
+    if len(debug_rows):
+        debug_rows.to_csv(DEBUG_FILE, index=False, compression="gzip")
 
-    print(f"Wrote {OUT_FILE.resolve()} with {len(out):,} rows.")
     print(f"Original rows with parseable '{PLANNED_COL}': {total_input_planned_count}")
     print(f"Rows where parsed planned existed and were emitted (counted): {total_emitted_planned_positive}")
     if DEBUG_FILE.exists():
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
+import argparse
 from pathlib import Path
 import pandas as pd
+import numpy as np
+from sheet_io import ARROW_STR, read_sheet, write_xlsx, write_xlsx_fast, write_parquet
 
 IN_FILE  = Path("plans_cleaned.xlsx")
-OUT_FILE = Path("plans_cleaned_daily.xlsx")
+OUT_FILE = Path("plans_cleaned_daily.xlsx")  # only with --xlsx/--fast-xlsx; the default output is the .parquet next to it
 
 # Daily-prorated numeric columns (present -> prorated, missing -> ignored)
 PRORATE_COLS = [
@@ -28,17 +31,27 @@ PRORATE_COLS = [
 START_COL = "Start_Date"
 END_COL   = "End_Date"
 
-def to_float_safe(v):
-    if pd.isna(v):
-        return v
-    s = str(v).replace(",", "").strip()
-    try:
-        return float(s)
-    except ValueError:
-        return v  # leave untouched if not numeric
+# what float() accepts once commas are dropped, checked up front so a whole column
+# parses in one cast (exactly as float() would) instead of one call per cell
+_float_re = r"[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?"
+
+def to_float_col(col):
+    # float per cell, NaN for blanks and anything that is not numeric
+    # NFKC: float() also reads fullwidth digits
+    s = col.astype(str).astype(ARROW_STR).mask(col.isna()).str.normalize("NFKC")
+    s = s.str.replace(",", "", regex=False).str.strip()
+    return s.where(s.str.fullmatch(_float_re)).astype("float64")
 
 def main():
-    df = pd.read_excel(IN_FILE, sheet_name=0, dtype="object")
+    ap = argparse.ArgumentParser(description="Split plans_cleaned.xlsx into one row per day.")
+    ap.add_argument("--xlsx", action="store_true", help=f"also write {OUT_FILE}")
+    ap.add_argument("--fast-xlsx", action="store_true",
+                    help=f"also write {OUT_FILE}, generating the sheet XML directly (faster, plain styling)")
+    ap.add_argument("--fp32", action="store_true",
+                    help="store the prorated columns as float32 (half the size, ~7 significant digits)")
+    args = ap.parse_args()
+
+    df = read_sheet(IN_FILE, dtype="object")
 
     # Validate date columns
     for c in (START_COL, END_COL):
@@ -47,40 +60,24 @@ def main():
     df[START_COL] = pd.to_datetime(df[START_COL], errors="coerce")
     df[END_COL]   = pd.to_datetime(df[END_COL], errors="coerce")
 
-    out_rows = []
-
-    for _, r in df.iterrows():
-        s = r[START_COL]
-        e = r[END_COL]
-
-        # If no valid dates, pass-through row with Date = NaT
-        if pd.isna(s) or pd.isna(e):
-            rr = r.copy()
-            rr["Date"] = pd.NaT
-            out_rows.append(rr)
-            continue
-
-        # Inclusive daily range
-        days = pd.date_range(s.normalize(), e.normalize(), freq="D")
-        n = max(1, len(days))
-
-        base = r.copy()
-
-        # Prorate only the columns that exist in the file
-        for c in PRORATE_COLS:
-            if c in base.index:
-                base[c] = to_float_safe(base[c])
-                if isinstance(base[c], (int, float)) or (
-                    isinstance(base[c], float) and not pd.isna(base[c])
-                ):
-                    base[c] = base[c] / n
-
-        for d in days:
-            rr = base.copy()
-            rr["Date"] = d
-            out_rows.append(rr)
-
-    out = pd.DataFrame(out_rows)
+    # Rows without valid dates pass through untouched with Date = NaT
+    nat = df[START_COL].isna() | df[END_COL].isna()
+    start = df[START_COL].dt.normalize()
+
+    # Inclusive day count per row (end before start emits nothing)
+    span = ((df[END_COL].dt.normalize() - start).dt.days + 1).fillna(0).astype(int).clip(lower=0)
+    reps = span.mask(nat, 1).to_numpy()
+    n = span.clip(lower=1)
+
+    # Prorate only the columns that exist in the file; non-numeric values stay as they are
+    prorate = [c for c in PRORATE_COLS if c in df.columns]
+    num = pd.DataFrame({c: to_float_col(df[c]) for c in prorate}, index=df.index)
+    keep = num.isna()
+    keep.loc[nat] = True
+    # one 2-D division by the day count across all prorate columns
+    df[prorate] = num.div(n, axis=0).mask(keep, df[prorate])
+    if args.fp32:  # only columns that came out fully numeric
+        df = df.astype({c: "float32" for c in prorate if df[c].dtype == "float64"})
 
     # Insert Date after End_Date
     orig_cols = list(df.columns)
@@ -90,12 +87,21 @@ def main():
     else:
         cols = ["Date"] + orig_cols  # fallback
 
-    out = out.reindex(columns=cols)
-
-    with pd.ExcelWriter(OUT_FILE, engine="xlsxwriter", datetime_format="yyyy-mm-dd") as xw:
-        out.to_excel(xw, index=False, sheet_name="fact_media_plan_daily")
-
-    print(f"Wrote {OUT_FILE.resolve()} with {len(out):,} rows.")
+    # One output row per day, built column by column in output order: each row's values repeated
+    # reps times, Date its start offset by 0..reps-1 days
+    pos = np.repeat(np.arange(len(df)), reps)
+    day = np.arange(len(pos)) - np.repeat(np.cumsum(reps) - reps, reps)
+    dates = start.mask(nat).to_numpy()[pos] + day.astype("timedelta64[D]")
+    out = pd.DataFrame({c: dates if c == "Date" else df[c].to_numpy()[pos] for c in cols}, copy=False)
+
+    # Parquet for downstream ETL; the xlsx copy on request, or when pyarrow is missing
+    out_pq = OUT_FILE.with_suffix(".parquet")
+    wrote_pq = write_parquet(out, out_pq)
+    if wrote_pq:
+        print(f"Wrote {out_pq.resolve()} with {len(out):,} rows.")
+    if args.xlsx or args.fast_xlsx or not wrote_pq:
+        (write_xlsx_fast if args.fast_xlsx else write_xlsx)(out, OUT_FILE, "fact_media_plan_daily")
+        print(f"Wrote {OUT_FILE.resolve()} with {len(out):,} rows.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,65 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+import apply_fixes  # noqa: E402
+
+
+def _csv(path, rows):
+    pd.DataFrame(rows).to_csv(path, index=False, encoding="utf-8-sig")
+
+
+def _read(path):
+    return pd.read_csv(path, dtype=str, encoding="utf-8-sig").fillna("")
+
+
+def _run(tmp_path, monkeypatch):
+    out, tax = tmp_path / "output", tmp_path / "taxonomy"
+    out.mkdir(exist_ok=True); tax.mkdir(exist_ok=True)
+    monkeypatch.setattr(apply_fixes, "OUT_DIR", out)
+    monkeypatch.setattr(apply_fixes, "TAX_DIR", tax)
+    return out, tax
+
+
+def test_brand_and_cbht_fix_packs(tmp_path, monkeypatch):
+    # todo_brands / todo_cbht as generate_fix_packs writes them: Market / FX_Year, no market / fx_year
+    out, tax = _run(tmp_path, monkeypatch)
+    _csv(tax / "brands.csv", {"raw_brand": ["Tuborg"], "raw_variant": [""], "market": ["Denmark"], "brand_clean": ["Tuborg"]})
+    _csv(tax / "cbht.csv", {"brand": ["1664"], "market": ["Canada"], "fx_year": ["2025"], "brand_league": ["Pioneer"]})
+    _csv(out / "todo_brands.csv", {"Market": ["Denmark", "Denmark", "Sweden"],
+                                   "raw_brand": ["Tuborg", "Tuborg", "Carlsberg"], "raw_variant": ["", "", ""]})
+    _csv(out / "todo_cbht.csv", {"brand": ["1664", "Tuborg"], "Market": ["Canada", "Denmark"], "FX_Year": ["2025", "2025"]})
+
+    apply_fixes.main()
+
+    brands = _read(tax / "brands.csv")
+    assert brands["raw_brand"].tolist() == ["Tuborg", "Tuborg", "Carlsberg"]
+    assert brands["market"].tolist() == ["Denmark", "", ""]
+    assert brands["Market"].tolist() == ["", "Denmark", "Sweden"]
+    cbht = _read(tax / "cbht.csv")
+    assert cbht["brand"].tolist() == ["1664", "1664", "Tuborg"]
+    assert cbht[["market", "fx_year"]].eq("").sum().tolist() == [2, 2]
+
+
+def test_duplicate_keys_in_destination_are_dropped(tmp_path, monkeypatch):
+    out, tax = _run(tmp_path, monkeypatch)
+    _csv(tax / "vendors.csv", {"raw_vendor": ["", "Acme", ""], "vendor_clean": ["", "Acme", "dup"]})
+    _csv(out / "todo_vendors.csv", {"raw_vendor": ["Acme", "Newco"]})
+
+    apply_fixes.main()
+
+    vendors = _read(tax / "vendors.csv")
+    assert vendors["raw_vendor"].tolist() == ["", "Acme", "Newco"]
+    assert vendors["vendor_clean"].tolist() == ["", "Acme", ""]
+
+
+def test_appends_unseen_keys_only(tmp_path, monkeypatch):
+    out, tax = _run(tmp_path, monkeypatch)
+    _csv(tax / "vendors.csv", {"raw_vendor": ["Acme"], "vendor_clean": ["Acme"]})
+    _csv(out / "todo_vendors.csv", {"raw_vendor": ["Acme", "Newco", "Newco"]})
+
+    apply_fixes.main()
+
+    assert _read(tax / "vendors.csv").values.tolist() == [["Acme", "Acme"], ["Newco", ""]]